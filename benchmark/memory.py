@@ -0,0 +1,92 @@
+# coding:utf-8
+
+'''Compare memory of default and compact stream representations.
+
+Usage: python benchmark/memory.py [--entries NUM] [--output FILE]
+'''
+
+from argparse import ArgumentParser
+from json import dumps
+from json import loads
+import os
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+import tracemalloc
+from typing import Any
+from typing import Dict
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # noqa:E501
+
+GROUPS = ("News", "Sports", "Movies", "Kids", "Music", "General")
+COUNTRIES = ("US", "UK", "DE", "FR", "ES", "IT", "CN", "JP")
+
+
+def synthetic_playlist(path: str, entries: int):
+    with open(path, "w", encoding="utf-8") as whdl:
+        whdl.write("#EXTM3U\n")
+        for i in range(entries):
+            country = COUNTRIES[i % len(COUNTRIES)]
+            whdl.write(f'#EXTINF:-1 tvg-id="Channel{i % (entries // 4 or 1)}.{country.lower()}" '  # noqa:E501
+                       f'tvg-country="{country}" tvg-language="English" '
+                       f'tvg-logo="https://i.imgur.com/logo{i % 64}.png" '
+                       f'group-title="{GROUPS[i % len(GROUPS)]}",Channel {i}\n'  # noqa:E501
+                       f"http://cdn{i % 16}.example.com/live/{i}/index.m3u8\n")  # noqa:E501
+
+
+def synthetic_probe(url: str) -> Dict[str, Any]:
+    '''probe data in the same shape as ffprobe output'''
+    return {"streams": [{"index": 0, "codec_name": "h264", "codec_type": "video", "width": 1920, "height": 1080, "tags": {"variant_bitrate": "4000000"}},  # noqa:E501
+                        {"index": 1, "codec_name": "aac", "codec_type": "audio", "sample_rate": "48000", "channels": 2, "tags": {"variant_bitrate": "4000000"}}],  # noqa:E501
+            "format": {"filename": url, "nb_streams": 2, "format_name": "hls", "format_long_name": "Apple HTTP Live Streaming", "probe_score": 100}}  # noqa:E501
+
+
+def measure(path: str, compact: bool) -> Dict[str, Any]:
+    from kittv.utils.stream import STREAMPROBERS  # noqa:E402
+    from kittv.utils.tuning import Tunes  # noqa:E402
+
+    STREAMPROBERS.compact = compact
+    tracemalloc.start()
+    tunes = Tunes()
+    tunes.extend(list(Tunes.iterload(path)))
+    for prober in STREAMPROBERS:
+        prober.update(synthetic_probe(prober.url), True)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"mode": "compact" if compact else "default",
+            "streams": len(tunes.streams), "channels": len(tunes),
+            "current_bytes": current, "peak_bytes": peak}
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--mode", choices=("default", "compact"), default=None,
+                        help="measure one mode in this process (internal)")
+    parser.add_argument("--playlist", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        print(dumps(measure(args.playlist, args.mode == "compact")))
+        return
+
+    results: List[Dict[str, Any]] = []
+    with TemporaryDirectory() as temp:
+        path: str = os.path.join(temp, "synthetic.m3u")
+        synthetic_playlist(path, args.entries)
+        for mode in ("default", "compact"):  # one process per mode
+            output = subprocess.check_output(
+                [sys.executable, __file__, "--mode", mode, "--playlist", path])
+            results.append(loads(output))
+    report = {"entries": args.entries, "results": results,
+              "saving": 1.0 - results[1]["current_bytes"] / results[0]["current_bytes"]}  # noqa:E501
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as whdl:
+            whdl.write(dumps(report, indent=2))
+    print(dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
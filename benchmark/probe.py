@@ -0,0 +1,144 @@
+# coding:utf-8
+
+'''Reproducible probe benchmark against the local synthetic IPTV server.
+
+Runs `kittv playlist --probe/--filter` at several playlist sizes, worker
+counts and backends, each case in its own process, and writes probes/sec,
+p50/p99 probe latency, peak RSS and wall time to a JSON file to diff
+between releases.
+
+Usage: python benchmark/probe.py [--sizes 100,1000] [--workers 8,64]
+                                 [--backends asyncio,ffprobe]
+                                 [--modes filter] [--output FILE]
+'''
+
+from argparse import ArgumentParser
+from functools import wraps
+from inspect import iscoroutinefunction
+from json import dump
+from json import dumps
+from json import load
+import os
+import resource
+import shutil
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from time import monotonic
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def timed(latencies: List[float], func: Callable) -> Callable:
+    if iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = monotonic()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                latencies.append(monotonic() - start)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = monotonic()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            latencies.append(monotonic() - start)
+    return wrapper
+
+
+def run_case(argv: List[str], result: str):
+    '''run kittv in this process, time every backend probe call'''
+    from kittv.cmds import main as kittv  # noqa:E402
+    from kittv.utils.aioprobe import AsyncProbe  # noqa:E402
+    from kittv.utils.ffprobe import FFPROBES  # noqa:E402
+
+    latencies: List[float] = []
+    AsyncProbe.probe = timed(latencies, AsyncProbe.probe)
+    FFPROBES.probe = timed(latencies, FFPROBES.probe)
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        start = monotonic()
+        try:
+            kittv(argv)
+        finally:
+            wall = monotonic() - start
+            sys.stdout = stdout
+    rss_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    with open(result, "w", encoding="utf-8") as whdl:
+        dump({"wall_seconds": wall, "probes": len(latencies),
+              "probes_per_second": len(latencies) / wall if wall > 0 else 0.0,  # noqa:E501
+              "latency_p50": percentile(latencies, 50),
+              "latency_p99": percentile(latencies, 99),
+              "peak_rss_kb": rss_self,
+              "peak_rss_children_kb": rss_children}, whdl)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=str, default="100,1000")
+    parser.add_argument("--workers", type=str, default="8,64")
+    parser.add_argument("--backends", type=str, default="asyncio,ffprobe")
+    parser.add_argument("--modes", type=str, default="filter")
+    parser.add_argument("--output", type=str, default="benchmark.json")
+    parser.add_argument("--case", nargs=2, default=None,
+                        metavar=("RESULT", "ARGV"), help="internal")
+    args = parser.parse_args()
+
+    if args.case is not None:
+        return run_case(args.case[1].split("\x1f"), args.case[0])
+
+    from server import SyntheticServer  # noqa:E402
+
+    backends: List[str] = [b for b in args.backends.split(",")
+                           if b != "ffprobe" or shutil.which("ffprobe")]
+    cases: List[Dict[str, Any]] = []
+    server = SyntheticServer().start()
+    try:
+        with TemporaryDirectory() as temp:
+            for size in (int(i) for i in args.sizes.split(",")):
+                for workers in (int(i) for i in args.workers.split(",")):
+                    for backend in backends:
+                        for mode in args.modes.split(","):
+                            result: str = os.path.join(temp, "result.json")
+                            argv: List[str] = [
+                                "playlist", f"--{mode}", "--workers", str(workers),  # noqa:E501
+                                "--backend", backend, "--no-blocklist",
+                                "-o", os.path.join(temp, "output.m3u"),
+                                f"{server.base}/playlist.m3u?size={size}"]
+                            subprocess.run([sys.executable, __file__, "--case",
+                                            result, "\x1f".join(argv)],
+                                           check=True, cwd=ROOT)
+                            with open(result, "r", encoding="utf-8") as rhdl:
+                                case: Dict[str, Any] = {
+                                    "size": size, "workers": workers,
+                                    "backend": backend, "mode": mode}
+                                case.update(load(rhdl))
+                            print(dumps(case))
+                            cases.append(case)
+    finally:
+        server.stop()
+    with open(args.output, "w", encoding="utf-8") as whdl:
+        dump({"cases": cases}, whdl, indent=2)
+    return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# coding:utf-8
+
+'''Local synthetic IPTV server for benchmarks.
+
+Paths (N is any number, so every entry has its own url):
+    /playlist.m3u?size=N  synthetic playlist mixing all kinds below
+    /ts/N.ts              healthy MPEG-TS
+    /hls/N/master.m3u8    HLS master -> media -> segments
+    /slow/N.ts            slow-drip, one TS packet every DRIP seconds
+    /404/N.ts             not found
+    /reset/N.ts           connection reset by peer
+    /hang/N.ts            accepts, never responds
+
+Usage: python benchmark/server.py [--port PORT]
+'''
+
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import socket
+import struct
+import sys
+from threading import Event
+from threading import Thread
+from time import sleep
+from typing import List
+from typing import Tuple
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+TS_PACKET = bytes([0x47, 0x40, 0x00, 0x10]) + bytes(184)
+TS_BODY = TS_PACKET * 350  # about 64 KiB
+DRIP = 0.5
+HANG = 60.0
+# kind and weight in synthetic playlist
+MIX: Tuple[Tuple[str, int], ...] = (("ts", 50), ("hls", 20), ("slow", 10),
+                                    ("404", 10), ("reset", 5), ("hang", 5))
+
+
+def stream_path(kind: str, index: int) -> str:
+    return f"/hls/{index}/master.m3u8" if kind == "hls" else f"/{kind}/{index}.ts"  # noqa:E501
+
+
+def playlist_kinds(size: int) -> List[str]:
+    '''deterministic mix of stream kinds'''
+    wheel: List[str] = [kind for kind, weight in MIX for _ in range(weight)]
+    return [wheel[(i * 37) % len(wheel)] for i in range(size)]
+
+
+class SyntheticHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stopping: Event = Event()
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def __send(self, body: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def __playlist(self, size: int):
+        host: str = self.headers.get("Host", "127.0.0.1")
+        rows: List[str] = ["#EXTM3U"]
+        for i, kind in enumerate(playlist_kinds(size)):
+            rows.append(f'#EXTINF:-1 tvg-id="{kind}{i}.bench" group-title="{kind}",{kind} {i}')  # noqa:E501
+            rows.append(f"http://{host}{stream_path(kind, i)}")
+        self.__send("\n".join(rows).encode() + b"\n", "audio/x-mpegurl")
+
+    def __reset(self):
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER,
+                                   struct.pack("ii", 1, 0))
+        self.connection.close()
+        self.close_connection = True
+
+    def __drip(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp2t")
+        self.end_headers()
+        try:
+            while not self.stopping.wait(DRIP):
+                self.wfile.write(TS_PACKET)
+                self.wfile.flush()
+        except OSError:
+            pass
+        self.close_connection = True
+
+    def __hls(self, index: str, name: str):
+        if name == "master.m3u8":
+            body = "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000\nmedia.m3u8\n"
+        elif name == "media.m3u8":
+            body = ("#EXTM3U\n#EXT-X-TARGETDURATION:2\n#EXT-X-MEDIA-SEQUENCE:1\n"  # noqa:E501
+                    + "".join(f"#EXTINF:2.0,\nseg{i}.ts\n" for i in range(3)))  # noqa:E501
+        else:
+            return self.__send(TS_BODY, "video/mp2t")
+        return self.__send(body.encode(), "application/vnd.apple.mpegurl")
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        self.do_GET()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        parts = urlsplit(self.path)
+        items: List[str] = parts.path.strip("/").split("/")
+        kind: str = items[0]
+        if kind == "playlist.m3u":
+            size = int(parse_qs(parts.query).get("size", ["100"])[0])
+            return self.__playlist(size)
+        if kind == "ts":
+            return self.__send(TS_BODY, "video/mp2t")
+        if kind == "hls" and len(items) == 3:
+            return self.__hls(items[1], items[2])
+        if kind == "slow":
+            return self.__drip()
+        if kind == "reset":
+            return self.__reset()
+        if kind == "hang":
+            self.stopping.wait(HANG)
+            self.close_connection = True
+            return None
+        return self.__send(b"not found", "text/plain", 404)
+
+
+class SyntheticServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, port: int = 0):
+        super().__init__(("127.0.0.1", port), SyntheticHandler)
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "SyntheticServer":
+        SyntheticHandler.stopping.clear()
+        Thread(target=self.serve_forever, name="synthetic_server",
+               daemon=True).start()
+        return self
+
+    def handle_error(self, request, client_address):
+        '''clients giving up on slow-drip or hang streams are expected'''
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def stop(self):
+        SyntheticHandler.stopping.set()
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    server = SyntheticServer(args.port).start()
+    print(f"serving on {server.base}")
+    try:
+        while True:
+            sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# coding:utf-8
+
+'''Command line startup time check with a budget.
+
+Each case runs in a fresh interpreter. The overhead of kittv is measured
+above a bare `import xkits`, which every command needs for parsing
+arguments. Exits with status 1 if the median overhead of any case exceeds
+the budget, or if a heavy dependency is imported before a subcommand runs.
+
+Usage: python benchmark/startup.py [--runs 10] [--budget 50] [--output FILE]
+'''
+
+from argparse import ArgumentParser
+from json import dumps
+from json import loads
+import os
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from kittv.utils.options import HEAVY_MODULES  # noqa:E402
+
+MAIN = "import sys; from kittv.cmds import main; main(sys.argv[1:])"
+CASES: Tuple[Tuple[str, List[str]], ...] = (
+    ("import", ["-c", "import kittv"]),
+    ("version", ["-c", MAIN, "--version"]),
+    ("probe help", ["-c", MAIN, "probe", "--help"]),
+    ("playlist help", ["-c", MAIN, "playlist", "--help"]),
+)
+MODULES = f"""
+import sys
+from kittv.cmds import main
+try:
+    main(["--version"])
+except SystemExit:
+    pass
+print(__import__("json").dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))
+"""
+
+
+def median_seconds(argv: List[str], runs: int) -> float:
+    timings: List[float] = []
+    for _ in range(runs):
+        started: float = perf_counter()
+        subprocess.run([sys.executable] + argv, cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=50.0,
+                        help="milliseconds above a bare xkits import")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    baseline: float = median_seconds(["-c", "import xkits"], args.runs)
+    results: List[Dict[str, Any]] = []
+    for name, argv in CASES:
+        seconds: float = median_seconds(argv, args.runs)
+        overhead: float = (seconds - baseline) * 1000
+        results.append({"case": name, "seconds": round(seconds, 4),
+                        "overhead_ms": round(overhead, 1),
+                        "passed": overhead <= args.budget})
+    output = subprocess.check_output([sys.executable, "-c", MODULES], cwd=ROOT)  # noqa:E501
+    heavy: List[str] = loads(output.decode().splitlines()[-1])
+    report = {"budget_ms": args.budget, "baseline_seconds": round(baseline, 4),  # noqa:E501
+              "results": results, "heavy_modules": heavy,
+              "passed": not heavy and all(r["passed"] for r in results)}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as whdl:
+            whdl.write(dumps(report, indent=2))
+    print(dumps(report, indent=2))
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
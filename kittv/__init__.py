@@ -1,5 +1,21 @@
 # coding:utf-8
 
-from .utils import IPTV_ORG_API  # noqa:F401
-from .utils import PlaylistTask  # noqa:F401
-from .utils import StreamProber  # noqa:F401
+from typing import TYPE_CHECKING
+from typing import Any
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .utils import IPTV_ORG_API  # noqa:F401
+    from .utils import PlaylistTask  # noqa:F401
+    from .utils import StreamProber  # noqa:F401
+
+__all__ = ["IPTV_ORG_API", "PlaylistTask", "StreamProber"]
+
+
+def __getattr__(name: str) -> Any:
+    '''heavy utils are imported on first use, not by the command line'''
+    if name not in __all__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")  # noqa:E501
+    from . import utils  # pylint: disable=import-outside-toplevel
+    value: Any = getattr(utils, name)
+    globals()[name] = value
+    return value
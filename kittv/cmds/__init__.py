@@ -14,6 +14,8 @@ from ..attribute import __urlhome__
 from ..attribute import __version__
 from .playlist import add_cmd_playlist
 from .probe import add_cmd_probe
+from .shard import add_cmd_shard
+from .watch import add_cmd_watch
 
 
 @add_command(__project__)
@@ -21,7 +23,8 @@ def add_cmd(_arg: argp):
     pass
 
 
-@run_command(add_cmd, add_cmd_playlist, add_cmd_probe)
+@run_command(add_cmd, add_cmd_playlist, add_cmd_probe, add_cmd_shard,
+             add_cmd_watch)
 def run_cmd(cmds: commands) -> int:
     return 0
 
@@ -1,14 +1,29 @@
 # coding:utf-8
 
+from contextlib import ExitStack
+from tempfile import TemporaryDirectory
+from typing import TYPE_CHECKING
 from typing import List
 from typing import Optional
+from typing import Sequence
 
 from xkits import add_command
 from xkits import argp
 from xkits import commands
 from xkits import run_command
 
-from ..utils import PlaylistTask
+from ..utils import ASYNC_CONCURRENCY
+from ..utils import BEST_MODES
+from ..utils import THROUGHPUT_DURATION
+from .probers import add_cache_arguments
+from .probers import add_prober_arguments
+from .probers import close_cache
+from .probers import open_cache
+from .probers import prober_argv
+from .probers import setup_probers
+
+if TYPE_CHECKING:  # pragma: no cover
+    from ..utils import StreamSelector
 
 
 @add_command("playlist", help="list streams")
@@ -19,19 +34,208 @@ def add_cmd_playlist(_arg: argp):
     _arg.add_argument("-o", "--output", type=str, help="output playlist",
                       nargs="?", const="playlist.m3u", default=None,
                       metavar="FILE")
+    _arg.add_argument("--gzip", help="also write gzip output playlist",
+                      action="store_true")
     _arg.add_argument("--workers", type=int, help="maximum task threads",
                       nargs="?", const=8, default=1, metavar="NUM")
+    _arg.add_argument("--loaders", type=int, help="maximum concurrent playlist loads",  # noqa:E501
+                      default=4, metavar="NUM")
+    _arg.add_argument("--ffprobe-slots", type=int, help="maximum concurrent ffprobe processes, default is workers",  # noqa:E501
+                      dest="ffprobe_slots", default=None, metavar="NUM")
+    _arg.add_argument("--concurrency", type=int, help="maximum concurrent asyncio probes",  # noqa:E501
+                      default=ASYNC_CONCURRENCY, metavar="NUM")
+    _arg.add_argument("--host-limit", type=int, help="maximum concurrent probes per host, default is unlimited",  # noqa:E501
+                      dest="host_limit", default=0, metavar="NUM")
+    add_prober_arguments(_arg)
+    add_cache_arguments(_arg)
+    _arg.add_argument("--throughput", type=float, help=f"measure download rate for SEC seconds, default is {THROUGHPUT_DURATION}",  # noqa:E501
+                      nargs="?", const=THROUGHPUT_DURATION, default=None,  # noqa:E501
+                      metavar="SEC")
+    _arg.add_argument("--bandwidth", type=float, help="total download budget of rate measurements in KiB/s, default is unlimited",  # noqa:E501
+                      default=0.0, metavar="KBPS")
+    _arg.add_argument("--min-rate", type=float, help="filter out streams slower than KBPS KiB/s",  # noqa:E501
+                      dest="min_rate", default=0.0, metavar="KBPS")
+    _arg.add_argument("--budget", type=float, help="seconds of probe run, most valuable probes first, unprobed streams are written to FILE.unprobed.m3u, not supported with --shards",  # noqa:E501
+                      default=0.0, metavar="SEC")
+    _arg.add_argument("--min-uptime", type=float, help="skip streams below PCT percent rolling uptime in probe history of cache",  # noqa:E501
+                      dest="min_uptime", default=0.0, metavar="PCT")
+    _arg.add_argument("--sort-uptime", help="most reliable streams of each channel first by probe history of cache",  # noqa:E501
+                      dest="sort_uptime", action="store_true")
+    _arg.add_argument("--best", type=str, help="only one available stream per channel, first in order or fastest of racing candidates",  # noqa:E501
+                      choices=BEST_MODES[1:], default="")
+    _arg.add_argument("--tiers", help="also write useful, good, wonderful and excellent playlists by download rate",  # noqa:E501
+                      action="store_true")
+    _arg.add_argument("--no-blocklist", help="do not drop channels of iptv-org blocklist before probe or filter",  # noqa:E501
+                      dest="blocklist", action="store_false")
+    _arg.add_argument("--country", type=str, help="only channels of iptv-org country, like: DE",  # noqa:E501
+                      action="append", default=[], metavar="CODE")
+    _arg.add_argument("--region", type=str, help="only channels of iptv-org region, like: EUR",  # noqa:E501
+                      action="append", default=[], metavar="CODE")
+    _arg.add_argument("--language", type=str, help="only channels of iptv-org language, like: deu",  # noqa:E501
+                      action="append", default=[], metavar="CODE")
+    _arg.add_argument("--category", type=str, help="only channels of iptv-org category, like: news",  # noqa:E501
+                      action="append", default=[], metavar="CODE")
+    _arg.add_argument("--shards", type=int, help="split unique urls into NUM shards by stable hash, probe them in worker processes and merge the results, 0 is disabled",  # noqa:E501
+                      default=0, metavar="NUM")
+    _arg.add_argument("--shard-workers", type=int, help="local worker processes of shards, default is shards, 0 waits for `shard` workers of other hosts",  # noqa:E501
+                      dest="shard_workers", default=None, metavar="NUM")
+    _arg.add_argument("--shard-queue", type=str, help="shard queue directory shared with other hosts, resume if already split, default is temporary",  # noqa:E501
+                      dest="shard_queue", default=None, metavar="DIR")
+    _arg.add_argument("--stale", type=float, help="requeue claimed shard without heartbeat for SEC seconds, default is 300",  # noqa:E501
+                      default=300.0, metavar="SEC")
+    _arg.add_argument("--stats", type=str, help="json summary of run metrics, default is stderr",  # noqa:E501
+                      nargs="?", const="-", default=None, metavar="FILE")
+    _arg.add_argument("--prometheus", type=str, help="run metrics in prometheus text format",  # noqa:E501
+                      default=None, metavar="FILE")
     _arg.add_argument(dest="playlists", help="m3u format file or url",
                       type=str, nargs="+", metavar="PLAYLIST")
 
 
+def split_codes(values: List[str]) -> List[str]:
+    '''repeated or comma separated codes'''
+    return [c.strip() for v in values for c in v.split(",") if c.strip()]
+
+
+def probe_shards(cmds: commands, directory: str,
+                 selectors: Sequence["StreamSelector"]) -> List[str]:
+    '''probe unique urls in shards by worker processes, merge the results
+    into shared probers, return local playlist of selected streams
+    '''
+    # pylint: disable=import-outside-toplevel
+    from requests import Session
+
+    from ..utils import ASYNCPROBES
+    from ..utils import STREAMPROBERS
+    from ..utils import ShardQueue
+    from ..utils import ShardTask
+
+    queue: ShardQueue = ShardQueue(directory)
+    if queue.manifest is None:
+        with Session() as session:
+            urls: int = queue.split(cmds.args.playlists, cmds.args.shards,
+                                    selectors=selectors, session=session)
+        cmds.stderr(f"split {urls} unique urls into {queue.shards} shards")
+    workers: int = cmds.args.workers or 1
+    processes: int = queue.shards if cmds.args.shard_workers is None else cmds.args.shard_workers  # noqa:E501
+    processes = min(processes, len(queue.pending))
+    argv: List[str] = prober_argv(cmds) + [
+        "--workers", str(workers),
+        "--concurrency", str(ASYNCPROBES.limit),
+        "--stale", str(cmds.args.stale),
+        "--throughput", str(STREAMPROBERS.throughput),
+        "--bandwidth", str(cmds.args.bandwidth / max(1, processes))]
+    with ShardTask(workers=workers) as tasker:
+        tasker.wait(queue, cmds.args.stale, ShardTask.spawn(queue, argv, processes))  # noqa:E501
+    cmds.stderr(f"merge {queue.merge()} probe results of {queue.shards} shards")  # noqa:E501
+    return [queue.playlist]
+
+
+def playlist_selectors(cmds: commands) -> List["StreamSelector"]:
+    '''iptv-org blocklist before probe or filter and channels of iptv-org
+    country, region, language and category, ValueError of unknown region
+    '''
+    # pylint: disable=import-outside-toplevel
+    from requests import RequestException
+
+    from ..utils import IPTV_ORG_API
+    from ..utils import BlocklistSelector
+    from ..utils import ChannelIndex
+    from ..utils import ChannelSelector
+
+    selectors: List[StreamSelector] = []
+    api: IPTV_ORG_API = IPTV_ORG_API()
+    if cmds.args.blocklist and (cmds.args.probe or cmds.args.filter):  # only saves probes  # noqa:E501
+        try:
+            selectors.append(BlocklistSelector(api))
+        except RequestException as error:
+            cmds.stderr(f"blocklist is unavailable: {error}")
+    countries: List[str] = split_codes(cmds.args.country)
+    regions: List[str] = split_codes(cmds.args.region)
+    languages: List[str] = split_codes(cmds.args.language)
+    categories: List[str] = split_codes(cmds.args.category)
+    if countries or regions or languages or categories:
+        index: ChannelIndex = ChannelIndex(api)
+        selectors.append(ChannelSelector(index, countries=countries, regions=regions,  # noqa:E501
+                                         languages=languages, categories=categories))  # noqa:E501
+    return selectors
+
+
+def setup_playlist(cmds: commands, workers: int):
+    '''shared probers, probe slots and download rate measurement'''
+    # pylint: disable=import-outside-toplevel
+    from ..utils import ASYNCPROBES
+    from ..utils import BANDWIDTH
+    from ..utils import FFPROBES
+    from ..utils import STREAMPROBERS
+
+    setup_probers(cmds, workers)
+    open_cache(cmds)
+    ASYNCPROBES.limit = cmds.args.concurrency
+    FFPROBES.slots = cmds.args.ffprobe_slots or workers
+    throughput: Optional[float] = cmds.args.throughput
+    STREAMPROBERS.throughput = throughput or (THROUGHPUT_DURATION if cmds.args.min_rate > 0 or cmds.args.tiers else 0.0)  # noqa:E501
+    BANDWIDTH.rate = cmds.args.bandwidth * 1024
+
+
+def report_playlist(cmds: commands, selectors: Sequence["StreamSelector"]):
+    '''summaries of stages on stderr, run metrics to stats and prometheus'''
+    # pylint: disable=import-outside-toplevel
+    from ..utils import FFPROBES
+    from ..utils import HOSTS
+    from ..utils import METRICS
+    from ..utils import STREAMPROBERS
+
+    for selector in selectors:
+        cmds.stderr(selector)
+    if STREAMPROBERS.precheck is not None:
+        cmds.stderr(STREAMPROBERS.precheck)
+    if FFPROBES.runs > 0:
+        cmds.stderr(FFPROBES)
+    if HOSTS.tripped > 0:
+        cmds.stderr(HOSTS)
+    stats: Optional[str] = cmds.args.stats
+    if stats == "-":
+        cmds.stderr(METRICS.dumpjson())
+    elif stats:
+        METRICS.dumpfile(stats)
+    prometheus: Optional[str] = cmds.args.prometheus
+    if prometheus:
+        METRICS.dumpfile(prometheus, prometheus=True)
+
+
 @run_command(add_cmd_playlist)
 def run_cmd_playlist(cmds: commands) -> int:
-    probe: bool = cmds.args.probe
-    filter: bool = cmds.args.filter
-    with PlaylistTask(probe=probe, filter=filter) as tasker:
-        workers: int = cmds.args.workers or 1
-        output: Optional[str] = cmds.args.output
+    # pylint: disable=import-outside-toplevel
+    from ..utils import PlaylistTask
+
+    try:
+        selectors: List[StreamSelector] = playlist_selectors(cmds)
+    except ValueError as error:
+        cmds.stderr(error)
+        return 1
+    if cmds.args.shards > 0 and cmds.args.budget > 0:
+        cmds.stderr("--budget is not supported with --shards")
+        return 1
+    workers: int = cmds.args.workers or 1
+    setup_playlist(cmds, workers)
+    with ExitStack() as stack:
         playlists: List[str] = cmds.args.playlists
-        tasker.list(playlists=playlists, workers=workers, output=output)
+        selected: List[StreamSelector] = selectors
+        if cmds.args.shards > 0:
+            directory: str = cmds.args.shard_queue or stack.enter_context(TemporaryDirectory(prefix="kittv-shards-"))  # noqa:E501
+            playlists = probe_shards(cmds, directory, selectors)
+            selected = []  # selected by split
+        with PlaylistTask(probe=cmds.args.probe, filter=cmds.args.filter,
+                          min_rate=cmds.args.min_rate * 1024, tiers=cmds.args.tiers,  # noqa:E501
+                          selectors=selected, host_limit=cmds.args.host_limit,  # noqa:E501
+                          best=cmds.args.best, budget=cmds.args.budget,
+                          min_uptime=cmds.args.min_uptime / 100,
+                          by_uptime=cmds.args.sort_uptime) as tasker:
+            output: Optional[str] = cmds.args.output
+            loaders: int = cmds.args.loaders
+            compress: bool = cmds.args.gzip
+            tasker.list(playlists=playlists, workers=workers, output=output,
+                        loaders=loaders, compress=compress)
+    report_playlist(cmds, selectors)
+    close_cache()
     return 0
@@ -1,29 +1,66 @@
 # coding:utf-8
 
+import sys
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+
 from xkits import add_command
 from xkits import argp
 from xkits import commands
 from xkits import run_command
 
-from ..utils import StreamProber
+from ..utils import PROBE_BACKENDS
 
 
 @add_command("probe", help="probe stream availability")
 def add_cmd_probe(_arg: argp):
     _arg.add_argument("--timeout", help="default is 3 seconds",
                       type=int, nargs=1, default=[3], metavar="SEC")
-    _arg.add_argument(dest="stream_url", help="stream url",
-                      type=str, nargs=1, metavar="URL")
+    _arg.add_argument("--backend", type=str, help="probe backend, default is ffprobe",  # noqa:E501
+                      choices=PROBE_BACKENDS, default="ffprobe")
+    _arg.add_argument("--workers", type=int, help="maximum concurrent probes, default is 8",  # noqa:E501
+                      default=8, metavar="NUM")
+    _arg.add_argument("--json", help="one json object per url, default for many urls",  # noqa:E501
+                      action="store_true")
+    _arg.add_argument(dest="stream_urls", help="stream url, read urls from stdin if none or -",  # noqa:E501
+                      type=str, nargs="*", metavar="URL")
+
+
+def iter_urls(urls: List[str]) -> Iterator[str]:
+    '''urls of arguments, one url per line of stdin for -'''
+    for url in urls or ["-"]:
+        if url != "-":
+            yield url
+            continue
+        for line in sys.stdin:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
 
 
 @run_command(add_cmd_probe)
 def run_cmd_probe(cmds: commands) -> int:
-    try:
-        url: str = cmds.args.stream_url[0]
-        timeout: float = float(cmds.args.timeout[0])
-        prober: StreamProber = StreamProber.ffprobe(url=url, timeout=timeout)
-        probe_score: int = prober.format.probe_score
-        cmds.stdout(f"score: {probe_score}")
-    except Exception:
-        cmds.stdout("score: -1")
+    # pylint: disable=import-outside-toplevel
+    from ..utils import ASYNCPROBES
+    from ..utils import FFPROBES
+    from ..utils import STREAMPROBERS
+    from ..utils import ProbeTask
+
+    urls: List[str] = cmds.args.stream_urls
+    timeout: float = float(cmds.args.timeout[0])
+    workers: int = max(1, cmds.args.workers)
+    STREAMPROBERS.backend = cmds.args.backend
+    ASYNCPROBES.limit = workers
+    FFPROBES.slots = workers
+    with ProbeTask(workers=workers, timeout=timeout) as tasker:
+        if len(urls) == 1 and urls[0] != "-" and not cmds.args.json:
+            record: Dict[str, Any] = tasker.record(urls[0])
+            if record["error"] is not None:
+                cmds.stderr(f"{record['error']}: {record.get('message', urls[0])}")  # noqa:E501
+            cmds.stdout(f"score: {record['score']}")
+            return 0
+        tasker.probe(iter_urls(urls))
+    cmds.stderr(tasker)
     return 0
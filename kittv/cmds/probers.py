@@ -0,0 +1,78 @@
+# coding:utf-8
+
+'''probe options shared by playlist, watch and shard commands'''
+
+from typing import List
+from typing import Optional
+
+from xkits import argp
+from xkits import commands
+
+from ..utils import BREAKER_COOLDOWN
+from ..utils import BREAKER_THRESHOLD
+from ..utils import PROBE_BACKENDS
+from ..utils import PROBE_DATABASE
+
+
+def add_prober_arguments(_arg: argp):
+    '''probe backend, circuit breaker of hosts and http pre-check'''
+    _arg.add_argument("--backend", type=str, help="probe backend, default is ffprobe",  # noqa:E501
+                      choices=PROBE_BACKENDS, default="ffprobe")
+    _arg.add_argument("--breaker", type=int, help=f"fast-fail host after NUM consecutive connection failures, default is {BREAKER_THRESHOLD}, 0 is disabled",  # noqa:E501
+                      default=BREAKER_THRESHOLD, metavar="NUM")
+    _arg.add_argument("--cooldown", type=float, help=f"seconds before retrying tripped host, default is {BREAKER_COOLDOWN:.0f}",  # noqa:E501
+                      default=BREAKER_COOLDOWN, metavar="SEC")
+    _arg.add_argument("--precheck", type=float, help="http pre-check before ffprobe with connect timeout",  # noqa:E501
+                      nargs="?", const=1.0, default=None, metavar="SEC")
+
+
+def add_cache_arguments(_arg: argp):
+    '''memory representation and persistent results of probes'''
+    _arg.add_argument("--compact", help="compact memory representation of streams",  # noqa:E501
+                      action="store_true")
+    _arg.add_argument("--cache", type=str, help="persistent probe results",
+                      nargs="?", const=PROBE_DATABASE, default=None,
+                      metavar="FILE")
+
+
+def prober_argv(cmds: commands) -> List[str]:
+    '''options of add_prober_arguments for a worker process'''
+    argv: List[str] = ["--backend", cmds.args.backend,
+                       "--breaker", str(cmds.args.breaker),
+                       "--cooldown", str(cmds.args.cooldown)]
+    if cmds.args.precheck:
+        argv.extend(["--precheck", str(cmds.args.precheck)])
+    return argv
+
+
+def setup_probers(cmds: commands, workers: int):
+    '''shared probers by options of add_prober_arguments'''
+    # pylint: disable=import-outside-toplevel
+    from ..utils import HOSTS
+    from ..utils import STREAMPROBERS
+    from ..utils import StreamPrecheck
+
+    STREAMPROBERS.backend = cmds.args.backend
+    precheck: Optional[float] = cmds.args.precheck
+    STREAMPROBERS.precheck = StreamPrecheck(precheck, workers) if precheck else None  # noqa:E501
+    HOSTS.threshold = cmds.args.breaker
+    HOSTS.cooldown = cmds.args.cooldown
+
+
+def open_cache(cmds: commands):
+    '''shared probers by options of add_cache_arguments'''
+    # pylint: disable=import-outside-toplevel
+    from ..utils import STREAMPROBERS
+    from ..utils import ProbeDatabase
+
+    STREAMPROBERS.compact = cmds.args.compact
+    cache: Optional[str] = cmds.args.cache
+    STREAMPROBERS.database = ProbeDatabase(cache) if cache else None
+
+
+def close_cache():
+    # pylint: disable=import-outside-toplevel
+    from ..utils import STREAMPROBERS
+
+    if STREAMPROBERS.database is not None:
+        STREAMPROBERS.database.close()
@@ -0,0 +1,57 @@
+# coding:utf-8
+
+from xkits import add_command
+from xkits import argp
+from xkits import commands
+from xkits import run_command
+
+from ..utils import ASYNC_CONCURRENCY
+from .probers import add_prober_arguments
+from .probers import setup_probers
+
+
+@add_command("shard", help="probe url shards of a work queue written by playlist --shards")  # noqa:E501
+def add_cmd_shard(_arg: argp):
+    _arg.add_argument("--timeout", type=float, help="default is 3 seconds",
+                      default=3.0, metavar="SEC")
+    _arg.add_argument("--workers", type=int, help="maximum concurrent probes, default is 8",  # noqa:E501
+                      default=8, metavar="NUM")
+    _arg.add_argument("--concurrency", type=int, help="maximum concurrent asyncio probes",  # noqa:E501
+                      default=ASYNC_CONCURRENCY, metavar="NUM")
+    add_prober_arguments(_arg)
+    _arg.add_argument("--throughput", type=float, help="measure download rate for SEC seconds",  # noqa:E501
+                      default=0.0, metavar="SEC")
+    _arg.add_argument("--bandwidth", type=float, help="total download budget of rate measurements in KiB/s, default is unlimited",  # noqa:E501
+                      default=0.0, metavar="KBPS")
+    _arg.add_argument("--wait", help="wait until all shards are done, probe shards requeued from lost workers",  # noqa:E501
+                      action="store_true")
+    _arg.add_argument("--stale", type=float, help="requeue claimed shard without heartbeat for SEC seconds, default is 300",  # noqa:E501
+                      default=300.0, metavar="SEC")
+    _arg.add_argument(dest="directory", help="shard queue directory, shared by all workers",  # noqa:E501
+                      type=str, metavar="DIR")
+
+
+@run_command(add_cmd_shard)
+def run_cmd_shard(cmds: commands) -> int:
+    # pylint: disable=import-outside-toplevel
+    from ..utils import ASYNCPROBES
+    from ..utils import BANDWIDTH
+    from ..utils import FFPROBES
+    from ..utils import STREAMPROBERS
+    from ..utils import ShardQueue
+    from ..utils import ShardTask
+
+    workers: int = max(1, cmds.args.workers)
+    setup_probers(cmds, workers)
+    STREAMPROBERS.throughput = cmds.args.throughput
+    ASYNCPROBES.limit = cmds.args.concurrency
+    FFPROBES.slots = workers
+    BANDWIDTH.rate = cmds.args.bandwidth * 1024
+    queue: ShardQueue = ShardQueue(cmds.args.directory)
+    with ShardTask(workers=workers, timeout=cmds.args.timeout) as tasker:
+        if cmds.args.wait:
+            tasker.wait(queue, cmds.args.stale)
+        else:
+            tasker.work(queue)
+    cmds.stderr(tasker)
+    return 0
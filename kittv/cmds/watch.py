@@ -0,0 +1,70 @@
+# coding:utf-8
+
+import signal
+from typing import List
+from typing import Optional
+
+from xkits import add_command
+from xkits import argp
+from xkits import commands
+from xkits import run_command
+
+from .probers import add_cache_arguments
+from .probers import add_prober_arguments
+from .probers import close_cache
+from .probers import open_cache
+from .probers import setup_probers
+
+
+@add_command("watch", help="keep re-probing due streams and rewrite filtered playlist")  # noqa:E501
+def add_cmd_watch(_arg: argp):
+    _arg.add_argument("-o", "--output", type=str, help="output playlist, default is playlist.m3u",  # noqa:E501
+                      default="playlist.m3u", metavar="FILE")
+    _arg.add_argument("--gzip", help="also write gzip output playlist",
+                      action="store_true")
+    _arg.add_argument("--workers", type=int, help="maximum concurrent probes, default is 8",  # noqa:E501
+                      default=8, metavar="NUM")
+    _arg.add_argument("--rate", type=float, help="maximum probes per second, default is 1, 0 is unlimited",  # noqa:E501
+                      default=1.0, metavar="NUM")
+    _arg.add_argument("--interval", type=float, help="seconds between output rewrites, default is 300",  # noqa:E501
+                      default=300.0, metavar="SEC")
+    add_prober_arguments(_arg)
+    add_cache_arguments(_arg)
+    _arg.add_argument("--prometheus", type=str, help="run metrics in prometheus text format, rewritten with output",  # noqa:E501
+                      default=None, metavar="FILE")
+    _arg.add_argument(dest="playlists", help="m3u format file or url",
+                      type=str, nargs="+", metavar="PLAYLIST")
+
+
+@run_command(add_cmd_watch)
+def run_cmd_watch(cmds: commands) -> int:
+    # pylint: disable=import-outside-toplevel
+    from requests import Session
+
+    from ..utils import ASYNCPROBES
+    from ..utils import FFPROBES
+    from ..utils import WatchTask
+
+    workers: int = max(1, cmds.args.workers)
+    setup_probers(cmds, workers)
+    open_cache(cmds)
+    ASYNCPROBES.limit = workers
+    FFPROBES.slots = workers
+    output: str = cmds.args.output
+    compress: bool = cmds.args.gzip
+    prometheus: Optional[str] = cmds.args.prometheus
+    playlists: List[str] = cmds.args.playlists
+    with WatchTask(workers=workers, rate=cmds.args.rate,
+                   interval=cmds.args.interval) as tasker:
+        signal.signal(signal.SIGTERM, lambda *_: tasker.stop())
+        with Session() as session:
+            probers: int = tasker.load(playlists, session=session)
+        cmds.stderr(f"watch {len(tasker.streams)} streams of {probers} unique urls")  # noqa:E501
+        try:
+            tasker.watch(output=output, compress=compress,
+                         prometheus=prometheus)
+        except KeyboardInterrupt:
+            tasker.stop()
+    tasker.flush(output, compress, prometheus)  # after in-flight probes
+    close_cache()
+    return 0
@@ -1,5 +1,85 @@
 # coding:utf-8
 
-from .iptv_org import IPTV_ORG_API  # noqa:F401
-from .stream import StreamProber  # noqa:F401
-from .task import PlaylistTask  # noqa:F401
+'''utils are imported on first use, the command line starts without ffmpeg,
+ipytv and iptv-org modules until a subcommand needs them
+'''
+
+from importlib import import_module
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Dict
+from typing import List
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .aioprobe import ASYNCPROBES  # noqa:F401
+    from .database import ProbeDatabase  # noqa:F401
+    from .ffprobe import FFPROBES  # noqa:F401
+    from .hosts import HOSTS  # noqa:F401
+    from .iptv_org import IPTV_ORG_API  # noqa:F401
+    from .metrics import METRICS  # noqa:F401
+    from .options import ASYNC_CONCURRENCY  # noqa:F401
+    from .options import BEST_MODES  # noqa:F401
+    from .options import BREAKER_COOLDOWN  # noqa:F401
+    from .options import BREAKER_THRESHOLD  # noqa:F401
+    from .options import PROBE_BACKENDS  # noqa:F401
+    from .options import PROBE_DATABASE  # noqa:F401
+    from .options import THROUGHPUT_DURATION  # noqa:F401
+    from .precheck import StreamPrecheck  # noqa:F401
+    from .selector import BlocklistSelector  # noqa:F401
+    from .selector import ChannelIndex  # noqa:F401
+    from .selector import ChannelSelector  # noqa:F401
+    from .selector import StreamSelector  # noqa:F401
+    from .shard import ShardQueue  # noqa:F401
+    from .shard import ShardTask  # noqa:F401
+    from .stream import STREAMPROBERS  # noqa:F401
+    from .stream import StreamProber  # noqa:F401
+    from .task import PlaylistTask  # noqa:F401
+    from .task import ProbeTask  # noqa:F401
+    from .throughput import BANDWIDTH  # noqa:F401
+    from .throughput import ThroughputMeter  # noqa:F401
+    from .watch import WatchTask  # noqa:F401
+
+EXPORTS: Dict[str, str] = {
+    "ASYNCPROBES": ".aioprobe",
+    "ProbeDatabase": ".database",
+    "FFPROBES": ".ffprobe",
+    "HOSTS": ".hosts",
+    "IPTV_ORG_API": ".iptv_org",
+    "METRICS": ".metrics",
+    "ASYNC_CONCURRENCY": ".options",
+    "BEST_MODES": ".options",
+    "BREAKER_COOLDOWN": ".options",
+    "BREAKER_THRESHOLD": ".options",
+    "PROBE_BACKENDS": ".options",
+    "PROBE_DATABASE": ".options",
+    "THROUGHPUT_DURATION": ".options",
+    "StreamPrecheck": ".precheck",
+    "BlocklistSelector": ".selector",
+    "ChannelIndex": ".selector",
+    "ChannelSelector": ".selector",
+    "StreamSelector": ".selector",
+    "ShardQueue": ".shard",
+    "ShardTask": ".shard",
+    "STREAMPROBERS": ".stream",
+    "StreamProber": ".stream",
+    "PlaylistTask": ".task",
+    "ProbeTask": ".task",
+    "BANDWIDTH": ".throughput",
+    "ThroughputMeter": ".throughput",
+    "WatchTask": ".watch",
+}
+__all__ = list(EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module: str = EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None  # noqa:E501
+    value: Any = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(EXPORTS))
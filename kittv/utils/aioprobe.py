@@ -0,0 +1,308 @@
+# coding:utf-8
+
+import asyncio
+from asyncio import AbstractEventLoop
+from asyncio import Semaphore
+from asyncio import StreamReader
+from asyncio import StreamWriter
+from concurrent.futures import Future
+import ssl
+from threading import Lock
+from threading import Thread
+from typing import Any
+from typing import Awaitable
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+from urllib.parse import urljoin
+from urllib.parse import urlsplit
+
+from xkits import singleton
+
+from ..attribute import __project__
+from ..attribute import __version__
+from .hls import HLSRESOLVER
+from .hls import HLSStale
+from .hosts import unreachable
+from .options import ASYNC_CONCURRENCY
+
+T = TypeVar("T")
+
+
+class AsyncProbeError(Exception):
+    pass
+
+
+class AsyncProbeTimeout(AsyncProbeError):
+    pass
+
+
+class AsyncProbeStale(AsyncProbeError):
+    pass
+
+
+class AsyncProbeUnreachable(AsyncProbeError):
+    '''connection failure of host'''
+
+
+class AsyncProbe():
+    '''probe http stream in-process, without ffprobe subprocess'''
+    SCHEMES = ("http", "https")
+    CHUNK_SIZE = 8192
+    PROBE_SIZE = 65536
+    REDIRECTS = 5
+    NESTING = 3  # maximum nesting of HLS playlists
+    SCORE_MAX = 100  # same as ffmpeg AVPROBE_SCORE_MAX
+    SCORE_MIME = 50  # only the content type looks like media
+    TS_PACKET = 188
+    TS_CHECKS = 4
+    SIGNATURES: Tuple[Tuple[int, bytes, str], ...] = (
+        (0, b"FLV", "flv"),
+        (4, b"ftyp", "mov,mp4,m4a,3gp,3g2,mj2"),
+        # fragmented MP4 (CMAF) segments of HLS start without ftyp
+        (4, b"styp", "mov,mp4,m4a,3gp,3g2,mj2"),
+        (4, b"moof", "mov,mp4,m4a,3gp,3g2,mj2"),
+        (4, b"sidx", "mov,mp4,m4a,3gp,3g2,mj2"),
+        (0, b"\x1a\x45\xdf\xa3", "matroska,webm"),
+        (0, b"OggS", "ogg"),
+        (0, b"ID3", "mp3"),
+    )
+    USER_AGENT = f"{__project__}/{__version__}"
+    SSLCONTEXT: Optional[ssl.SSLContext] = None
+
+    def __init__(self, url: str, timeout: float):
+        self.__timeout: float = timeout
+        self.__url: str = url
+        self.__connected: bool = False
+
+    def __str__(self) -> str:
+        return f"IPTV Stream Async Probe URL={self.url}"
+
+    @property
+    def url(self) -> str:
+        return self.__url
+
+    @property
+    def timeout(self) -> float:
+        return self.__timeout
+
+    @classmethod
+    def supported(cls, url: str) -> bool:
+        try:
+            return urlsplit(url).scheme.lower() in cls.SCHEMES
+        except ValueError:
+            return False
+
+    @classmethod
+    def sslcontext(cls) -> ssl.SSLContext:
+        if cls.SSLCONTEXT is None:
+            # same as ffprobe, which does not verify certificates by default
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            cls.SSLCONTEXT = context
+        return cls.SSLCONTEXT
+
+    @classmethod
+    def detect(cls, body: bytes, content_type: str) -> Tuple[str, int]:
+        '''detect container format by signature, like ffprobe'''
+        for i in range(min(len(body), cls.TS_PACKET)):
+            if all(body[i + n * cls.TS_PACKET:i + n * cls.TS_PACKET + 1] == b"\x47"  # noqa:E501
+                   for n in range(cls.TS_CHECKS)):
+                return "mpegts", cls.SCORE_MAX
+        for offset, magic, name in cls.SIGNATURES:
+            if body[offset:offset + len(magic)] == magic:
+                return name, cls.SCORE_MAX
+        if len(body) >= 2 and body[0] == 0xFF and body[1] & 0xF6 == 0xF0:
+            return "aac", cls.SCORE_MAX
+        if content_type.startswith(("video/", "audio/")):
+            return content_type, cls.SCORE_MIME
+        return "", 0
+
+    @classmethod
+    async def read(cls, reader: StreamReader, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = await reader.read(min(cls.CHUNK_SIZE, size - len(data)))
+            if not chunk:
+                break
+            data += chunk
+        return bytes(data)
+
+    @classmethod
+    async def read_chunked(cls, reader: StreamReader, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            line: bytes = await reader.readline()
+            length: int = int(line.split(b";")[0].strip() or b"0", 16)
+            if length <= 0:
+                break
+            data += await reader.readexactly(min(length, size - len(data)))
+            if len(data) >= size:
+                break
+            await reader.readline()  # end of chunk
+        return bytes(data)
+
+    async def connect(self, url: str) -> Tuple[int, Dict[str, str], StreamReader, StreamWriter]:  # noqa:E501
+        '''send GET request, return status, headers and open connection'''
+        parts = urlsplit(url)
+        scheme: str = parts.scheme.lower()
+        if scheme not in self.SCHEMES or not parts.hostname:
+            raise AsyncProbeError(f"unsupported url: {url}")
+        secure: bool = scheme == "https"
+        host: str = parts.hostname
+        port: int = parts.port or (443 if secure else 80)
+        path: str = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        authority: str = host if parts.port is None else f"{host}:{port}"
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=self.sslcontext() if secure else None)
+        self.__connected = True
+        try:
+            writer.write((f"GET {path} HTTP/1.1\r\n"
+                          f"Host: {authority}\r\n"
+                          f"User-Agent: {self.USER_AGENT}\r\n"
+                          "Accept: */*\r\n"
+                          "Connection: close\r\n\r\n").encode("latin-1"))
+            await writer.drain()
+            status_line: bytes = await reader.readline()
+            items = status_line.decode("latin-1").split(None, 2)
+            if len(items) < 2 or not items[0].startswith("HTTP/"):
+                raise AsyncProbeError(f"invalid response: {status_line!r}")
+            status: int = int(items[1])
+            headers: Dict[str, str] = {}
+            while True:
+                line: bytes = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+        except BaseException:
+            writer.close()
+            raise
+        return status, headers, reader, writer
+
+    async def request(self, url: str) -> Tuple[int, Dict[str, str], bytes]:
+        '''send GET request, return status, headers and head of body'''
+        status, headers, reader, writer = await self.connect(url)
+        try:
+            if status >= 300:
+                return status, headers, b""
+            if "chunked" in headers.get("transfer-encoding", "").lower():
+                body = await self.read_chunked(reader, self.PROBE_SIZE)
+            else:
+                length: str = headers.get("content-length", "")
+                size: int = int(length) if length.isdigit() else self.PROBE_SIZE  # noqa:E501
+                body = await self.read(reader, min(size, self.PROBE_SIZE))
+            return status, headers, body
+        finally:
+            writer.close()
+
+    async def fetch(self, url: str) -> Tuple[str, Dict[str, str], bytes]:
+        '''follow redirects, return final url, headers and head of body'''
+        for _ in range(self.REDIRECTS + 1):
+            status, headers, body = await self.request(url)
+            if status in (301, 302, 303, 307, 308) and "location" in headers:
+                url = urljoin(url, headers["location"])
+                continue
+            if status >= 300:
+                raise AsyncProbeError(f"HTTP {status}: {url}")
+            return url, headers, body
+        raise AsyncProbeError(f"too many redirects: {self.url}")
+
+    async def probe_hls(self, url: str, text: str, origin: str) -> Tuple[str, int]:  # noqa:E501
+        '''probe only one segment of the chosen variant'''
+        segment: str = await HLSRESOLVER.resolve(url, text, self.fetch, origin)
+        _, headers, body = await self.fetch(segment)
+        _, score = self.detect(body, headers.get("content-type", "").lower())
+        return "hls", score
+
+    async def probe_url(self, url: str) -> Tuple[str, int]:
+        final, headers, body = await HLSRESOLVER.fetch(url, self.fetch)
+        text: Optional[str] = HLSRESOLVER.playlist(body)
+        if text is not None:
+            return await self.probe_hls(final, text, url)
+        return self.detect(body, headers.get("content-type", "").lower())
+
+    async def locate_url(self, url: str) -> str:
+        final, _, body = await HLSRESOLVER.fetch(url, self.fetch)
+        text: Optional[str] = HLSRESOLVER.playlist(body)
+        if text is None:
+            return final
+        return await HLSRESOLVER.resolve(final, text, self.fetch, url)
+
+    async def guard(self, coro: Awaitable[T]) -> T:
+        '''await with timeout, raise AsyncProbeError on failure'''
+        try:
+            return await asyncio.wait_for(coro, timeout=self.timeout)
+        except asyncio.TimeoutError as error:
+            if not self.__connected:  # host never answered
+                raise AsyncProbeUnreachable(f"connect timeout: {self.url}") from error  # noqa:E501
+            raise AsyncProbeTimeout(f"timeout: {self.url}") from error
+        except HLSStale as error:
+            raise AsyncProbeStale(f"{error}") from error
+        except (OSError, ValueError, asyncio.IncompleteReadError) as error:
+            if isinstance(error, OSError) and unreachable(error):
+                raise AsyncProbeUnreachable(f"{error}: {self.url}") from error  # noqa:E501
+            raise AsyncProbeError(f"{error}: {self.url}") from error
+
+    async def locate(self) -> str:
+        '''url of one segment to probe if HLS, otherwise the url itself'''
+        return await self.guard(self.locate_url(self.url))
+
+    async def probe(self) -> Dict[str, Any]:
+        '''probe stream, return data in the same shape as ffprobe'''
+        name, score = await self.guard(self.probe_url(self.url))
+        return {"format": {"filename": self.url, "format_name": name,
+                           "probe_score": score}}
+
+
+@singleton
+class AsyncProbeLoop():
+    '''event loop shared by all asyncio probes, running in background'''
+
+    def __init__(self, limit: int = ASYNC_CONCURRENCY):
+        self.__loop: Optional[AbstractEventLoop] = None
+        self.__semaphore: Optional[Semaphore] = None
+        self.__limit: int = max(1, limit)
+        self.__lock: Lock = Lock()
+
+    @property
+    def limit(self) -> int:
+        '''maximum concurrent probes'''
+        return self.__limit
+
+    @limit.setter
+    def limit(self, limit: int):
+        with self.__lock:
+            self.__limit = max(1, limit)
+            self.__semaphore = None
+
+    @property
+    def loop(self) -> AbstractEventLoop:
+        with self.__lock:
+            if self.__loop is None:
+                loop = asyncio.new_event_loop()
+                Thread(target=loop.run_forever, name="aioprobe_loop",
+                       daemon=True).start()
+                self.__loop = loop
+            return self.__loop
+
+    async def __limited(self, coro: Awaitable[Any]) -> Any:
+        if self.__semaphore is None:
+            self.__semaphore = Semaphore(self.limit)
+        async with self.__semaphore:
+            return await coro
+
+    def submit(self, coro: Awaitable[Any]) -> Future:
+        '''schedule coroutine in background loop'''
+        return asyncio.run_coroutine_threadsafe(self.__limited(coro), self.loop)  # noqa:E501
+
+    def run(self, coro: Awaitable[Any]) -> Any:
+        '''schedule coroutine in background loop and wait for its result'''
+        return self.submit(coro).result()
+
+
+ASYNCPROBES: AsyncProbeLoop = AsyncProbeLoop()
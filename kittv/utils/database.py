@@ -0,0 +1,124 @@
+# coding:utf-8
+
+from collections import namedtuple
+from json import dumps
+from json import loads
+import os
+import sqlite3
+from threading import Lock
+from time import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+
+class ProbeDatabase():
+    '''probe results persisted in sqlite, shared across runs'''
+    NAMEDTUPLE = namedtuple("probe", ["data", "success", "timeout", "lifetime", "expires"])  # noqa:E501
+    RELIABILITY = namedtuple("reliability", ["probes", "uptime", "p50", "p90", "failures"])  # noqa:E501
+    HISTORY_WINDOW = 7 * 86400  # seconds of rolling reliability
+    HISTORY_PROBES = 100  # maximum probes of rolling reliability
+    RETENTION = 30 * 86400  # seconds to keep probe history
+
+    def __init__(self, path: str):
+        abspath: str = os.path.abspath(path)
+        dirname: str = os.path.dirname(abspath)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        self.__conn: sqlite3.Connection = sqlite3.connect(
+            abspath, check_same_thread=False, isolation_level=None)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute("PRAGMA synchronous=NORMAL")
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS probes ("
+                            "url TEXT PRIMARY KEY, data TEXT NOT NULL, "
+                            "success INTEGER NOT NULL, timeout REAL NOT NULL, "
+                            "lifetime REAL NOT NULL, expires REAL NOT NULL)")
+        self.__conn.execute("CREATE TABLE IF NOT EXISTS history ("  # append-only  # noqa:E501
+                            "url TEXT NOT NULL, time INTEGER NOT NULL, "
+                            "score INTEGER NOT NULL, latency REAL NOT NULL, "
+                            "outcome TEXT NOT NULL)")
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS history_url "
+                            "ON history (url, time)")
+        self.__lock: Lock = Lock()
+        self.__path: str = abspath
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __str__(self) -> str:
+        return f"IPTV Stream Probe Database PATH={self.path}"
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__conn.execute("SELECT COUNT(*) FROM probes").fetchone()[0]  # noqa:E501
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def load(self, url: str) -> Optional[NAMEDTUPLE]:
+        with self.__lock:
+            row = self.__conn.execute(
+                "SELECT data, success, timeout, lifetime, expires "
+                "FROM probes WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        data: Dict[str, Any] = loads(row[0])
+        return self.NAMEDTUPLE(data=data, success=bool(row[1]), timeout=row[2],
+                               lifetime=row[3], expires=row[4])
+
+    def save(self, url: str, data: Dict[str, Any], success: bool,
+             timeout: float, lifetime: float, expires: float):
+        with self.__lock:
+            self.__conn.execute(
+                "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?)",
+                (url, dumps(data), int(success), timeout, lifetime, expires))
+
+    def record(self, url: str, score: int, latency: float, outcome: str,
+               timestamp: Optional[float] = None):
+        '''append outcome of one probe to history'''
+        with self.__lock:
+            self.__conn.execute(
+                "INSERT INTO history VALUES (?, ?, ?, ?, ?)",
+                (url, int(time() if timestamp is None else timestamp), score,
+                 round(latency, 3), outcome))
+
+    def history(self, url: str, limit: int = HISTORY_PROBES) -> List[Any]:
+        '''recent probes of url in rolling window, newest first'''
+        since: int = int(time() - self.HISTORY_WINDOW)
+        with self.__lock:
+            return self.__conn.execute(
+                "SELECT time, score, latency, outcome FROM history "
+                "WHERE url = ? AND time >= ? ORDER BY time DESC, rowid DESC "
+                "LIMIT ?", (url, since, limit)).fetchall()
+
+    def reliability(self, url: str, min_score: int = 90) -> RELIABILITY:
+        '''rolling uptime, latency percentiles of available probes and
+        consecutive failures of the latest probes
+        '''
+        rows = self.history(url)
+        up: List[bool] = [row[1] >= min_score for row in rows]
+        latencies: List[float] = sorted(row[2] for row, ok in zip(rows, up) if ok)  # noqa:E501
+        failures: int = next((i for i, ok in enumerate(up) if ok), len(up))
+
+        def percentile(q: float) -> float:
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0  # noqa:E501
+
+        return self.RELIABILITY(probes=len(rows), uptime=sum(up) / len(up) if up else 0.0,  # noqa:E501
+                                p50=percentile(0.5), p90=percentile(0.9),
+                                failures=failures)
+
+    def prune(self, retention: float = RETENTION) -> int:
+        '''forget probe history older than retention seconds'''
+        with self.__lock:
+            return self.__conn.execute("DELETE FROM history WHERE time < ?",
+                                       (int(time() - retention),)).rowcount
+
+    def close(self):
+        self.prune()
+        with self.__lock:
+            self.__conn.close()
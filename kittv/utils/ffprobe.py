@@ -0,0 +1,115 @@
+# coding:utf-8
+
+from json import loads
+import os
+import signal
+from subprocess import PIPE
+from subprocess import Popen
+from subprocess import TimeoutExpired
+from threading import BoundedSemaphore
+from threading import Lock
+from time import monotonic
+from typing import Any
+from typing import Dict
+from typing import List
+
+from ffmpeg import Error as fferror
+from xkits import singleton
+
+
+class FFProbeTimeout(fferror):
+    def __init__(self, cmd: str, deadline: float):
+        super().__init__(cmd, b"", f"killed after {deadline:.1f}s".encode())
+
+
+@singleton
+class FFProbeExecutor():
+    '''bounded ffprobe subprocesses with wall-clock deadline'''
+    GRACE = 5.0  # seconds allowed beyond ffprobe's own io timeout
+
+    def __init__(self, slots: int = 16, cmd: str = "ffprobe"):
+        self.__semaphore: BoundedSemaphore = BoundedSemaphore(max(1, slots))
+        self.__slots: int = max(1, slots)
+        self.__cmd: str = cmd
+        self.__intlock: Lock = Lock()
+        self.__runs: int = 0
+        self.__killed: int = 0
+        self.__waiting: float = 0.0  # total queue wait time
+        self.__probing: float = 0.0  # total probe time
+
+    def __str__(self) -> str:
+        runs: int = max(1, self.runs)
+        return f"ffprobe {self.runs} runs in {self.slots} slots: avg wait {self.waiting / runs:.3f}s, avg probe {self.probing / runs:.3f}s, {self.killed} killed"  # noqa:E501
+
+    @property
+    def slots(self) -> int:
+        '''maximum concurrent ffprobe subprocesses'''
+        return self.__slots
+
+    @slots.setter
+    def slots(self, slots: int):
+        self.__slots = max(1, slots)
+        self.__semaphore = BoundedSemaphore(self.__slots)
+
+    @property
+    def runs(self) -> int:
+        return self.__runs
+
+    @property
+    def killed(self) -> int:
+        return self.__killed
+
+    @property
+    def waiting(self) -> float:
+        return self.__waiting
+
+    @property
+    def probing(self) -> float:
+        return self.__probing
+
+    @classmethod
+    def kill(cls, proc: Popen):
+        '''kill ffprobe and its children, then reap'''
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(proc.pid, signal.SIGKILL)
+            else:  # pragma: no cover
+                proc.kill()
+        except ProcessLookupError:  # pragma: no cover
+            pass
+        proc.communicate()
+
+    def probe(self, url: str, timeout: float) -> Dict[str, Any]:
+        '''same as ffmpeg.probe, killed if still running after deadline'''
+        args: List[str] = [self.__cmd, "-show_format", "-show_streams",
+                           "-of", "json", "-timeout",
+                           str(int(timeout * 1000000)), url]
+        deadline: float = timeout + self.GRACE
+        queued: float = monotonic()
+        with self.__semaphore:
+            started: float = monotonic()
+            proc = Popen(args, stdout=PIPE, stderr=PIPE,
+                         start_new_session=hasattr(os, "killpg"))
+            try:
+                out, err = proc.communicate(timeout=deadline)
+                killed: bool = False
+            except TimeoutExpired:
+                self.kill(proc)
+                killed = True
+            stopped: float = monotonic()
+        with self.__intlock:
+            self.__runs += 1
+            self.__killed += int(killed)
+            self.__waiting += started - queued
+            self.__probing += stopped - started
+        if killed:
+            raise FFProbeTimeout(self.__cmd, deadline)
+        if proc.returncode != 0:
+            raise fferror(self.__cmd, out, err)
+        try:
+            return loads(out.decode("utf-8"))
+        except ValueError as error:
+            raise fferror(self.__cmd, out, err) from error
+
+
+FFPROBES: FFProbeExecutor = FFProbeExecutor()
@@ -0,0 +1,130 @@
+# coding:utf-8
+
+from threading import Lock
+from time import monotonic
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+from urllib.parse import urlsplit
+
+import m3u8
+from xkits import CacheAtom
+from xkits import singleton
+
+Fetcher = Callable[[str], Awaitable[Tuple[str, Dict[str, str], bytes]]]
+
+
+class HLSError(ValueError):
+    pass
+
+
+class HLSStale(HLSError):
+    '''live playlist without media sequence advancement'''
+
+
+@singleton
+class HLSResolver():
+    '''resolve HLS master to one variant and media to one segment,
+    cache the chosen variant of each master and track live playlists
+    '''
+    SCHEMES = ("http", "https")
+    SUFFIXES = (".m3u8",)
+    NESTING = 3  # maximum nesting of HLS playlists
+    LIFETIME = 3600.0  # seconds to reuse resolved variant of master
+    STALE_FACTOR = 3  # target durations without new media sequence
+    TARGET_DURATION = 10.0  # default of playlist without target duration
+
+    def __init__(self):
+        self.__variants: Dict[str, CacheAtom[str]] = {}
+        self.__sequences: Dict[str, Tuple[int, float]] = {}
+        self.__intlock: Lock = Lock()  # internal lock
+
+    def __len__(self) -> int:
+        return len(self.__variants)
+
+    @classmethod
+    def playlist(cls, body: bytes) -> Optional[str]:
+        '''text of HLS playlist, None if body is not a playlist'''
+        head: bytes = body.lstrip(b"\xef\xbb\xbf \t\r\n")
+        return head.decode("utf-8", errors="replace") if head.startswith(b"#EXTM3U") else None  # noqa:E501
+
+    def variant(self, master: str) -> Optional[str]:
+        '''cached variant url of master'''
+        cache: Optional[CacheAtom[str]] = self.__variants.get(master)
+        return cache.data if cache is not None and not cache.expired else None  # noqa:E501
+
+    def forget(self, master: str):
+        with self.__intlock:
+            self.__variants.pop(master, None)
+
+    def suspect(self, url: str) -> bool:
+        '''url looks like HLS playlist or is a known master'''
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return False
+        if parts.scheme.lower() not in self.SCHEMES:
+            return False
+        return parts.path.lower().endswith(self.SUFFIXES) or url in self.__variants  # noqa:E501
+
+    @classmethod
+    def choose(cls, master: m3u8.M3U8) -> str:
+        '''lowest bandwidth variant, cheapest to probe'''
+        variants = [v for v in master.playlists if v.absolute_uri]
+        if not variants:
+            raise HLSError(f"no variant in master playlist: {master.base_uri}")  # noqa:E501
+        return min(variants, key=lambda v: v.stream_info.bandwidth or 0).absolute_uri  # noqa:E501
+
+    def stale(self, url: str, media: m3u8.M3U8) -> bool:
+        '''media sequence of live playlist did not advance for a while'''
+        if media.is_endlist:
+            return False  # VOD
+        sequence: int = media.media_sequence or 0
+        target: float = media.target_duration or self.TARGET_DURATION
+        now: float = monotonic()
+        with self.__intlock:
+            last: Optional[Tuple[int, float]] = self.__sequences.get(url)
+            if last is None or last[0] != sequence:
+                self.__sequences[url] = (sequence, now)
+                return False
+        return now - last[1] > target * self.STALE_FACTOR
+
+    def segment(self, url: str, media: m3u8.M3U8) -> str:
+        '''last segment of media playlist, closest to live edge'''
+        if not media.segments:
+            raise HLSError(f"no segment in media playlist: {url}")
+        if self.stale(url, media):
+            raise HLSStale(f"stale live playlist at media sequence {media.media_sequence}: {url}")  # noqa:E501
+        return media.segments[-1].absolute_uri
+
+    async def fetch(self, url: str, fetch: Fetcher) -> Tuple[str, Dict[str, str], bytes]:  # noqa:E501
+        '''fetch cached variant instead of master, fallback to master'''
+        variant: Optional[str] = self.variant(url)
+        if variant is not None:
+            try:
+                return await fetch(variant)
+            except Exception:  # pylint: disable=broad-except
+                self.forget(url)  # variant moved or its token expired
+        return await fetch(url)
+
+    async def resolve(self, url: str, text: str, fetch: Fetcher,
+                      origin: Optional[str] = None) -> str:
+        '''segment url of HLS playlist fetched from origin (redirected to url)'''  # noqa:E501
+        for _ in range(self.NESTING):
+            playlist: m3u8.M3U8 = m3u8.loads(text, uri=url)
+            if not playlist.is_variant:
+                return self.segment(url, playlist)
+            variant: str = self.choose(playlist)
+            with self.__intlock:
+                self.__variants[origin or url] = CacheAtom(data=variant, lifetime=self.LIFETIME)  # noqa:E501
+            url, _, body = await fetch(variant)
+            media: Optional[str] = self.playlist(body)
+            if media is None:
+                return url  # variant is media stream itself
+            text, origin = media, None
+        raise HLSError(f"too deep playlist nesting: {url}")
+
+
+HLSRESOLVER: HLSResolver = HLSResolver()
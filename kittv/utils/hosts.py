@@ -0,0 +1,213 @@
+# coding:utf-8
+
+from collections import deque
+import errno
+import socket
+from threading import Lock
+from time import monotonic
+from typing import Deque
+from typing import Dict
+from typing import Generic
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+from urllib.parse import urlsplit
+
+from xkits import singleton
+
+from .options import BREAKER_COOLDOWN
+from .options import BREAKER_THRESHOLD
+
+T = TypeVar("T")
+UNREACHABLE_ERRNOS = (errno.EHOSTUNREACH, errno.ENETUNREACH, errno.ETIMEDOUT)
+UNREACHABLE_MESSAGES: Tuple[bytes, ...] = (
+    b"Connection refused", b"Connection reset", b"timed out",
+    b"No route to host", b"Network is unreachable",
+    b"Failed to resolve hostname", b"Name or service not known")
+
+
+def host_of(url: str) -> str:
+    try:
+        return (urlsplit(url).hostname or "").lower()
+    except ValueError:
+        return ""
+
+
+def unreachable(error: BaseException) -> bool:
+    '''connection failure of host, not an error of stream'''
+    if isinstance(error, (ConnectionError, socket.gaierror)):
+        return True
+    return isinstance(error, OSError) and error.errno in UNREACHABLE_ERRNOS  # noqa:E501
+
+
+def unreachable_stderr(stderr: Optional[bytes]) -> bool:
+    '''connection failure reported by ffprobe'''
+    return stderr is not None and any(m in stderr for m in UNREACHABLE_MESSAGES)  # noqa:E501
+
+
+class HostCircuit():
+    '''circuit breaker of one host: closed, open and half-open'''
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, host: str, threshold: int, cooldown: float):
+        self.__host: str = host
+        self.__threshold: int = threshold
+        self.__cooldown: float = cooldown
+        self.__state: str = self.CLOSED
+        self.__failures: int = 0  # consecutive connection failures
+        self.__opened: float = 0.0
+        self.__tripped: int = 0  # fast-failed probes
+        self.__intlock: Lock = Lock()  # internal lock
+
+    def __str__(self) -> str:
+        return f"host {self.host} circuit {self.state}, {self.tripped} probes fast-failed"  # noqa:E501
+
+    @property
+    def host(self) -> str:
+        return self.__host
+
+    @property
+    def state(self) -> str:
+        return self.__state
+
+    @property
+    def tripped(self) -> int:
+        return self.__tripped
+
+    def allow(self) -> bool:
+        '''False to fast-fail, half-open lets one probe through'''
+        with self.__intlock:
+            if self.__state == self.CLOSED:
+                return True
+            if monotonic() - self.__opened >= self.__cooldown:  # open, or trial was cancelled  # noqa:E501
+                self.__state = self.HALF_OPEN
+                self.__opened = monotonic()
+                return True
+            self.__tripped += 1
+            return False
+
+    def report(self, reachable: bool):
+        with self.__intlock:
+            if reachable:
+                self.__failures = 0
+                self.__state = self.CLOSED
+                return
+            self.__failures += 1
+            if self.__state == self.HALF_OPEN or self.__failures >= self.__threshold:  # noqa:E501
+                self.__state = self.OPEN
+                self.__opened = monotonic()
+
+
+@singleton
+class HostBreakers():
+    '''circuit breakers of all hosts, shared by all probers'''
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):  # noqa:E501
+        self.__threshold: int = max(0, threshold)
+        self.__cooldown: float = max(0.0, cooldown)
+        self.__circuits: Dict[str, HostCircuit] = {}
+        self.__intlock: Lock = Lock()  # internal lock
+
+    def __str__(self) -> str:
+        tripped = [c for c in self.__circuits.values() if c.tripped > 0]
+        return f"circuit breakers tripped on {len(tripped)} hosts: {sum(c.tripped for c in tripped)} probes fast-failed"  # noqa:E501
+
+    def __len__(self) -> int:
+        return len(self.__circuits)
+
+    @property
+    def threshold(self) -> int:
+        '''consecutive connection failures to trip, 0 is disabled'''
+        return self.__threshold
+
+    @threshold.setter
+    def threshold(self, threshold: int):
+        with self.__intlock:
+            self.__threshold = max(0, threshold)
+            self.__circuits.clear()
+
+    @property
+    def cooldown(self) -> float:
+        '''seconds before half-open retry'''
+        return self.__cooldown
+
+    @cooldown.setter
+    def cooldown(self, cooldown: float):
+        with self.__intlock:
+            self.__cooldown = max(0.0, cooldown)
+            self.__circuits.clear()
+
+    @property
+    def tripped(self) -> int:
+        return sum(c.tripped for c in self.__circuits.values())
+
+    def circuit(self, url: str) -> Optional[HostCircuit]:
+        if self.threshold <= 0:
+            return None
+        host: str = host_of(url)
+        try:
+            return self.__circuits[host]
+        except KeyError:
+            with self.__intlock:
+                return self.__circuits.setdefault(host, HostCircuit(host, self.threshold, self.cooldown))  # noqa:E501
+
+    def allow(self, url: str) -> bool:
+        circuit: Optional[HostCircuit] = self.circuit(url)
+        return circuit is None or circuit.allow()
+
+    def report(self, url: str, reachable: bool):
+        circuit: Optional[HostCircuit] = self.circuit(url)
+        if circuit is not None:
+            circuit.report(reachable)
+
+
+HOSTS: HostBreakers = HostBreakers()
+
+
+class HostSlots(Generic[T]):
+    '''limit concurrent probes per host, defer the others in order'''
+
+    def __init__(self, limit: int = 0):
+        self.__limit: int = max(0, limit)
+        self.__running: Dict[str, int] = {}
+        self.__deferred: Dict[str, Deque[T]] = {}
+        self.__intlock: Lock = Lock()  # internal lock
+
+    @property
+    def limit(self) -> int:
+        '''maximum concurrent probes per host, 0 is unlimited'''
+        return self.__limit
+
+    @property
+    def deferred(self) -> int:
+        return sum(len(d) for d in self.__deferred.values())
+
+    def admit(self, host: str, item: T) -> bool:
+        '''take a slot of host, or defer item until a slot is released'''
+        if self.__limit <= 0:
+            return True
+        with self.__intlock:
+            running: int = self.__running.get(host, 0)
+            if running < self.__limit:
+                self.__running[host] = running + 1
+                return True
+            self.__deferred.setdefault(host, deque()).append(item)
+            return False
+
+    def release(self, host: str) -> Optional[T]:
+        '''release a slot of host, or hand it over to next deferred item'''
+        if self.__limit <= 0:
+            return None
+        with self.__intlock:
+            deferred: Optional[Deque[T]] = self.__deferred.get(host)
+            if deferred:
+                item: T = deferred.popleft()
+                if not deferred:
+                    del self.__deferred[host]
+                return item
+            self.__running[host] -= 1
+            if self.__running[host] <= 0:
+                del self.__running[host]
+            return None
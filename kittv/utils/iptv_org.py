@@ -1,17 +1,33 @@
 # coding:utf-8
 
 from collections import namedtuple
+from json import dump
+from json import load
 from json import loads
+import os
+from tempfile import mkstemp
+from threading import Lock
+from threading import Thread
+from time import time
 from typing import Any
 from typing import Dict
 from typing import Generator
 from typing import Iterable
 from typing import Iterator
 from typing import List
+from typing import Optional
 from typing import Set
 
+from requests import HTTPError
+from requests import RequestException
+from requests import Response
+from requests import Session
+from requests.adapters import HTTPAdapter
 from xkits import Page
 from xkits import Site
+from xkits import TaskPool
+
+IPTV_ORG_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "kittv", "iptv-org")  # noqa:E501
 
 
 class IPTV_ORG_SITE(Site):
@@ -194,10 +210,36 @@ class IPTV_ORG_BLOCKLIST(IPTV_ORG_DATABASE):
         self.update_index(channel)
 
 
+class IPTV_ORG_CHANNELS(IPTV_ORG_DATABASE):
+    CHANNELS_URL = "https://iptv-org.github.io/iptv"
+    NAMEDTUPLE = namedtuple('channel', ["name", "country", "languages", "categories"])  # noqa:E501
+
+    def __init__(self):
+        super().__init__(url=self.CHANNELS_URL)
+        self.__channels: Dict[str, IPTV_ORG_CHANNELS.NAMEDTUPLE] = {}
+
+    @property
+    def database(self) -> Dict[str, NAMEDTUPLE]:
+        return self.__channels
+
+    def update(self, items: List[Dict[str, Any]]):
+        # noqa:E501, like: [{'id': 'KanalD.tr', 'name': 'Kanal D', 'country': 'TR', 'languages': ['tur'], 'categories': ['general'], ...}, ...]
+        tuples: List[IPTV_ORG_CHANNELS.NAMEDTUPLE] = []
+        ids: List[str] = []
+        for item in items:
+            ids.append(item["id"])
+            tuples.append(self.NAMEDTUPLE(name=item["name"], country=item.get("country") or "",  # noqa:E501
+                                          languages=item.get("languages") or [],  # noqa:E501
+                                          categories=item.get("categories") or []))  # noqa:E501
+        self.__channels = dict(zip(ids, tuples))
+        self.update_index(i.lower() for i in ids)
+
+
 class IPTV_ORG_API(IPTV_ORG_SITE):
     API_URL = "https://iptv-org.github.io/api"
+    TIMEOUT = 30.0
 
-    def __init__(self):
+    def __init__(self, cache: Optional[str] = IPTV_ORG_CACHE):
         super().__init__(url=self.API_URL)
         self.__subdivisions = IPTV_ORG_SUBDIVISIONS()
         self.__categories = IPTV_ORG_CATEGORIES()
@@ -205,35 +247,165 @@ class IPTV_ORG_API(IPTV_ORG_SITE):
         self.__languages = IPTV_ORG_LANGUAGES()
         self.__countries = IPTV_ORG_COUNTRIES()
         self.__regions = IPTV_ORG_REGIONS()
+        self.__channels = IPTV_ORG_CHANNELS()
+        self.__databases: Dict[str, IPTV_ORG_DATABASE] = {
+            "subdivisions": self.__subdivisions,
+            "categories": self.__categories,
+            "blocklist": self.__blocklist,
+            "languages": self.__languages,
+            "countries": self.__countries,
+            "regions": self.__regions,
+            "channels": self.__channels,
+        }
+        self.__locks: Dict[str, Lock] = {k: Lock() for k in self.__databases}
+        self.__versions: Dict[str, str] = {}  # etag or fetched time loaded
+        self.__cache: Optional[str] = cache
+        adapter = HTTPAdapter(pool_connections=len(self.__databases),
+                              pool_maxsize=len(self.__databases))
+        self.__session: Session = Session()
+        self.__session.mount("http://", adapter)
+        self.__session.mount("https://", adapter)
+
+    @property
+    def cache(self) -> Optional[str]:
+        '''directory of on-disk copies, None is disabled'''
+        return self.__cache
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.__databases)
 
     @property
     def subdivisions(self) -> IPTV_ORG_SUBDIVISIONS:
+        self.database("subdivisions")
         return self.__subdivisions
 
     @property
     def categories(self) -> IPTV_ORG_CATEGORIES:
+        self.database("categories")
         return self.__categories
 
     @property
     def blocklist(self) -> IPTV_ORG_BLOCKLIST:
+        self.database("blocklist")
         return self.__blocklist
 
     @property
     def languages(self) -> IPTV_ORG_LANGUAGES:
+        self.database("languages")
         return self.__languages
 
     @property
     def countries(self) -> IPTV_ORG_COUNTRIES:
+        self.database("countries")
         return self.__countries
 
     @property
     def regions(self) -> IPTV_ORG_REGIONS:
+        self.database("regions")
         return self.__regions
 
+    @property
+    def channels(self) -> IPTV_ORG_CHANNELS:
+        self.database("channels")
+        return self.__channels
+
+    def database(self, name: str, stale: bool = False) -> IPTV_ORG_DATABASE:
+        '''load only this database on first access, stale restores any
+        on-disk copy without waiting for the network
+        '''
+        if name not in self.__versions:
+            self.load(name, stale=stale)
+        return self.__databases[name]
+
+    def __path(self, name: str) -> Optional[str]:
+        return os.path.join(self.__cache, f"{name}.json") if self.__cache else None  # noqa:E501
+
+    def __read(self, name: str) -> Optional[Dict[str, Any]]:
+        path: Optional[str] = self.__path(name)
+        if path is None or not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as rhdl:
+                return load(rhdl)
+        except ValueError:
+            return None  # corrupted, fetch again
+
+    def __write(self, name: str, record: Dict[str, Any]):
+        path: Optional[str] = self.__path(name)
+        if path is None:
+            return
+        dirname, basename = os.path.split(path)
+        os.makedirs(dirname, exist_ok=True)
+        # unique temp file, concurrent runs never write the same one
+        fd, temp = mkstemp(prefix=f".{basename}.", suffix=".tmp", dir=dirname)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as whdl:
+                dump(record, whdl)
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    def __apply(self, name: str, record: Dict[str, Any]):
+        '''parse items only if this version is not loaded yet'''
+        version: str = record.get("etag") or str(record["fetched"])
+        if self.__versions.get(name) != version:
+            self.__databases[name].update(record["items"])
+            self.__versions[name] = version
+
+    def __fetch(self, name: str, record: Optional[Dict[str, Any]]) -> Dict[str, Any]:  # noqa:E501
+        '''conditional fetch, on-disk copy is kept if unchanged by 304'''
+        headers: Dict[str, str] = {}
+        if record is not None and record.get("etag"):
+            headers["If-None-Match"] = record["etag"]
+        if record is not None and record.get("last_modified"):
+            headers["If-Modified-Since"] = record["last_modified"]
+        url: str = self.parse(f"{name}.json")
+        response: Response = self.__session.get(
+            url, headers=headers, timeout=self.TIMEOUT)
+        if response.status_code == 304 and record is None:
+            # nothing to revalidate, fetch in full without conditions
+            response = self.__session.get(
+                url, headers={"Cache-Control": "no-cache"},
+                timeout=self.TIMEOUT)
+            if response.status_code == 304:
+                raise HTTPError(f"304 without on-disk copy: {url}",
+                                response=response)
+        if record is None or response.status_code != 304:
+            response.raise_for_status()
+            record = {"etag": response.headers.get("ETag"),
+                      "last_modified": response.headers.get("Last-Modified"),  # noqa:E501
+                      "items": loads(response.text)}
+        record["fetched"] = time()
+        return record
+
+    def load(self, name: str, force: bool = False, stale: bool = False) -> None:  # noqa:E501
+        '''restore on-disk copy if fresh, otherwise conditional fetch,
+        stale on-disk copy is restored at once and refreshed in background
+        '''
+        with self.__locks[name]:
+            record: Optional[Dict[str, Any]] = self.__read(name)
+            if record is not None and not force:
+                if time() - record["fetched"] < self.LIFETIME:
+                    return self.__apply(name, record)
+                if stale:
+                    Thread(target=self.load, args=(name, True), daemon=True,
+                           name=f"iptv_org_{name}").start()
+                    return self.__apply(name, record)
+            try:
+                record = self.__fetch(name, record)
+                self.__write(name, record)
+            except RequestException:
+                if record is None:
+                    raise
+                # offline, keep stale on-disk copy
+            return self.__apply(name, record)
+
     def refresh(self) -> None:
-        self.subdivisions.update_page(self.page("subdivisions.json"))
-        self.categories.update_page(self.page("categories.json"))
-        self.blocklist.update_page(self.page("blocklist.json"))
-        self.languages.update_page(self.page("languages.json"))
-        self.countries.update_page(self.page("countries.json"))
-        self.regions.update_page(self.page("regions.json"))
+        '''fetch all databases concurrently, skip unchanged by 304'''
+        with TaskPool(workers=len(self.__databases), prefix="iptv_org") as pool:  # noqa:E501
+            jobs = [pool.submit(self.load, name, True) for name in self.names]
+        for job in jobs:
+            job.result  # pylint: disable=pointless-statement
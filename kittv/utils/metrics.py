@@ -0,0 +1,197 @@
+# coding:utf-8
+
+from contextlib import contextmanager
+from json import dumps
+import os
+from threading import Lock
+from time import monotonic
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+from xkits import singleton
+
+from ..attribute import __project__
+
+Labels = Tuple[Tuple[str, str], ...]
+LATENCY_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)  # noqa:E501
+TIMEOUT_BUCKETS: Tuple[float, ...] = (1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0)
+LIFETIME_BUCKETS: Tuple[float, ...] = (1800.0, 3600.0, 7200.0, 10800.0, 21600.0, 43200.0, 86400.0)  # noqa:E501
+RATE_BUCKETS: Tuple[float, ...] = (65536.0, 204800.0, 512000.0, 716800.0, 1048576.0, 4194304.0, 16777216.0)  # noqa:E501
+
+
+class Histogram():
+    '''fixed buckets histogram, same semantics as prometheus'''
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.__buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self.__counts: List[int] = [0] * (len(self.__buckets) + 1)  # +Inf
+        self.__count: int = 0
+        self.__sum: float = 0.0
+        self.__min: float = float("inf")
+        self.__max: float = float("-inf")
+
+    @property
+    def buckets(self) -> Tuple[float, ...]:
+        return self.__buckets
+
+    @property
+    def count(self) -> int:
+        return self.__count
+
+    @property
+    def sum(self) -> float:
+        return self.__sum
+
+    def observe(self, value: float):
+        index: int = len(self.__buckets)
+        for i, bound in enumerate(self.__buckets):
+            if value <= bound:
+                index = i
+                break
+        self.__counts[index] += 1
+        self.__count += 1
+        self.__sum += value
+        self.__min = min(self.__min, value)
+        self.__max = max(self.__max, value)
+
+    def cumulative(self) -> Iterator[Tuple[float, int]]:
+        '''upper bound and cumulative count of each bucket'''
+        total: int = 0
+        for bound, count in zip(self.__buckets + (float("inf"),), self.__counts):  # noqa:E501
+            total += count
+            yield bound, total
+
+    def quantile(self, q: float) -> float:
+        '''upper bound of the bucket holding the quantile'''
+        if self.__count == 0:
+            return 0.0
+        rank: float = q * self.__count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return min(bound, self.__max)
+        return self.__max  # pragma: no cover
+
+    def dump(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {"count": self.count, "sum": self.sum}
+        if self.count > 0:
+            summary.update({"avg": self.sum / self.count, "min": self.__min,
+                            "max": self.__max})
+            summary.update({f"p{int(q * 100)}": self.quantile(q)
+                            for q in self.QUANTILES})
+        return summary
+
+
+@singleton
+class RunMetrics():
+    '''counters, gauges and histograms of one run'''
+
+    def __init__(self):
+        self.__counters: Dict[Tuple[str, Labels], float] = {}
+        self.__gauges: Dict[Tuple[str, Labels], float] = {}
+        self.__histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.__intlock: Lock = Lock()  # internal lock
+
+    @classmethod
+    def labels(cls, labels: Dict[str, str]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def count(self, name: str, value: float = 1, **labels: str):
+        key = (name, self.labels(labels))
+        with self.__intlock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, **labels: str):
+        with self.__intlock:
+            self.__gauges[(name, self.labels(labels))] = value
+
+    def observe(self, name: str, value: float,
+                buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels: str):
+        key = (name, self.labels(labels))
+        with self.__intlock:
+            if key not in self.__histograms:
+                self.__histograms[key] = Histogram(buckets)
+            self.__histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str):
+        '''observe elapsed seconds of the block'''
+        started: float = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, monotonic() - started, **labels)
+
+    def reset(self):
+        with self.__intlock:
+            self.__counters.clear()
+            self.__gauges.clear()
+            self.__histograms.clear()
+
+    @classmethod
+    def __keyname(cls, name: str, labels: Labels) -> str:
+        if not labels:
+            return name
+        return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+    def dump(self) -> Dict[str, Any]:
+        '''json friendly summary'''
+        with self.__intlock:
+            return {
+                "counters": {self.__keyname(*k): v for k, v in sorted(self.__counters.items())},  # noqa:E501
+                "gauges": {self.__keyname(*k): v for k, v in sorted(self.__gauges.items())},  # noqa:E501
+                "histograms": {self.__keyname(*k): v.dump() for k, v in sorted(self.__histograms.items())},  # noqa:E501
+            }
+
+    def dumpjson(self) -> str:
+        return dumps(self.dump(), indent=2, sort_keys=True)
+
+    @classmethod
+    def __promlabels(cls, labels: Labels, *extra: Tuple[str, str]) -> str:
+        items: Labels = labels + extra
+        if not items:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+    def prometheus(self) -> str:
+        '''prometheus text exposition format'''
+        prefix: str = __project__
+        lines: List[str] = []
+        typed: Dict[str, str] = {}
+
+        def header(name: str, kind: str):
+            if name not in typed:
+                typed[name] = kind
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self.__intlock:
+            for (name, labels), value in sorted(self.__counters.items()):
+                metric: str = f"{prefix}_{name}_total"
+                header(metric, "counter")
+                lines.append(f"{metric}{self.__promlabels(labels)} {value}")
+            for (name, labels), value in sorted(self.__gauges.items()):
+                metric = f"{prefix}_{name}"
+                header(metric, "gauge")
+                lines.append(f"{metric}{self.__promlabels(labels)} {value}")
+            for (name, labels), hist in sorted(self.__histograms.items()):
+                metric = f"{prefix}_{name}"
+                header(metric, "histogram")
+                for bound, total in hist.cumulative():
+                    le: str = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{metric}_bucket{self.__promlabels(labels, ('le', le))} {total}")  # noqa:E501
+                lines.append(f"{metric}_sum{self.__promlabels(labels)} {hist.sum}")  # noqa:E501
+                lines.append(f"{metric}_count{self.__promlabels(labels)} {hist.count}")  # noqa:E501
+        return "\n".join(lines) + "\n"
+
+    def dumpfile(self, path: str, prometheus: bool = False):
+        '''write json summary or prometheus text, replaced atomically'''
+        temp: str = f"{path}.tmp"
+        with open(temp, "w", encoding="utf-8") as whdl:
+            whdl.write(self.prometheus() if prometheus else self.dumpjson())
+        os.replace(temp, path)
+
+
+METRICS: RunMetrics = RunMetrics()
@@ -0,0 +1,21 @@
+# coding:utf-8
+
+'''choices and defaults of command line options, cheap to import before
+any subcommand'''
+
+import os
+
+PROBE_BACKENDS = ("ffprobe", "asyncio")
+BEST_MODES = ("", "first", "fastest")  # race mode of one stream per channel
+PROBE_DATABASE = os.path.join(os.path.expanduser("~"), ".cache", "kittv", "probe.db")  # noqa:E501
+ASYNC_CONCURRENCY = 1024  # maximum concurrent asyncio probes
+BREAKER_THRESHOLD = 5  # consecutive connection failures of a tripped host
+BREAKER_COOLDOWN = 60.0  # seconds before retrying a tripped host
+THROUGHPUT_DURATION = 5.0  # seconds of download rate measurement
+# loaded only when a subcommand actually needs them, xkits already imports
+# requests for every command
+HEAVY_MODULES = ("ffmpeg", "ipytv", "jsonschema", "m3u8",
+                 "kittv.utils.aioprobe", "kittv.utils.database",
+                 "kittv.utils.iptv_org", "kittv.utils.precheck",
+                 "kittv.utils.stream", "kittv.utils.task",
+                 "kittv.utils.tuning")
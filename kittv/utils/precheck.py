@@ -0,0 +1,104 @@
+# coding:utf-8
+
+from threading import Lock
+from urllib.parse import urlsplit
+
+from requests import ConnectionError as RequestsConnectionError
+from requests import ConnectTimeout
+from requests import RequestException
+from requests import Response
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3 import disable_warnings
+from urllib3.exceptions import InsecureRequestWarning
+
+from ..attribute import __project__
+from ..attribute import __version__
+from .hosts import HOSTS
+
+
+class StreamPrecheck():
+    '''cheap http pre-check before the expensive media probe'''
+    SCHEMES = ("http", "https")
+    USER_AGENT = f"{__project__}/{__version__}"
+
+    def __init__(self, timeout: float = 1.0, pool: int = 64):
+        disable_warnings(InsecureRequestWarning)  # same as ffprobe
+        adapter = HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+        self.__session: Session = Session()
+        self.__session.headers["User-Agent"] = self.USER_AGENT
+        self.__session.mount("http://", adapter)
+        self.__session.mount("https://", adapter)
+        self.__timeout: float = max(0.1, timeout)  # connect timeout
+        self.__intlock: Lock = Lock()
+        self.__skipped: int = 0
+        self.__rejected: int = 0
+        self.__escalated: int = 0
+
+    def __str__(self) -> str:
+        return f"precheck {self.total} streams: {self.rejected} rejected (ffprobe avoided), {self.escalated} escalated, {self.skipped} skipped"  # noqa:E501
+
+    @property
+    def timeout(self) -> float:
+        return self.__timeout
+
+    @property
+    def total(self) -> int:
+        return self.skipped + self.rejected + self.escalated
+
+    @property
+    def skipped(self) -> int:
+        '''not http streams, escalate without pre-check'''
+        return self.__skipped
+
+    @property
+    def rejected(self) -> int:
+        '''bad streams, no need to probe'''
+        return self.__rejected
+
+    @property
+    def escalated(self) -> int:
+        '''survivors, need to probe'''
+        return self.__escalated
+
+    def __request(self, url: str, timeout: float) -> Response:
+        '''HEAD first, fallback to ranged GET if HEAD is refused'''
+        response: Response = self.__session.head(
+            url, timeout=(self.timeout, timeout), allow_redirects=True,
+            verify=False)
+        if response.status_code < 400:
+            return response
+        response = self.__session.get(
+            url, timeout=(self.timeout, timeout), allow_redirects=True,
+            verify=False, stream=True, headers={"Range": "bytes=0-0"})
+        response.close()
+        return response
+
+    @classmethod
+    def supported(cls, url: str) -> bool:
+        try:
+            return urlsplit(url).scheme.lower() in cls.SCHEMES
+        except ValueError:
+            return False
+
+    def check(self, url: str, timeout: float = 3.0) -> bool:
+        '''return False if the stream is certainly bad'''
+        if not self.supported(url):
+            with self.__intlock:
+                self.__skipped += 1
+            return True
+        try:
+            response = self.__request(url, timeout)
+            success: bool = response.status_code < 400
+            HOSTS.report(url, True)
+        except (ConnectTimeout, RequestsConnectionError):
+            success = False  # refused, unreachable or NXDOMAIN
+            HOSTS.report(url, False)
+        except RequestException:
+            success = True  # let the media probe decide
+        with self.__intlock:
+            if success:
+                self.__escalated += 1
+            else:
+                self.__rejected += 1
+        return success
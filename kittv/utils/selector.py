@@ -0,0 +1,205 @@
+# coding:utf-8
+
+from threading import Lock
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+
+from .iptv_org import IPTV_ORG_API
+from .stream import IPTVStream
+
+
+def normalize_tvg_id(tvg_id: str) -> str:
+    '''lowercase channel id without feed suffix, like: kanald.tr@sd'''
+    return tvg_id.strip().split("@", 1)[0].lower()
+
+
+class ChannelIndex():
+    '''inverted indexes of iptv-org metadata to channel ids'''
+
+    def __init__(self, api: IPTV_ORG_API):
+        self.__api: IPTV_ORG_API = api
+        self.__regions: Dict[str, Set[str]] = {}  # region -> countries
+        self.__countries: Dict[str, Set[str]] = {}  # country -> channels
+        self.__languages: Dict[str, Set[str]] = {}  # language -> channels
+        self.__categories: Dict[str, Set[str]] = {}  # category -> channels
+        self.__names: Dict[str, str] = {}  # language name -> code
+        self.__channels: Set[str] = set()
+        self.__built: bool = False
+        self.__intlock: Lock = Lock()  # internal lock
+
+    @property
+    def api(self) -> IPTV_ORG_API:
+        return self.__api
+
+    @property
+    def channels(self) -> Set[str]:
+        '''all known normalized channel ids'''
+        self.build()
+        return self.__channels
+
+    def build(self):
+        with self.__intlock:
+            if self.__built:
+                return
+            for code, region in self.api.regions.database.items():
+                self.__regions[code.upper()] = {c.upper() for c in region.countries}  # noqa:E501
+            for code, name in self.api.languages.database.items():
+                self.__names[name.lower()] = code.lower()
+            spoken: Dict[str, Set[str]] = {  # fallback languages of country
+                code.upper(): {lang.lower() for lang in country.languages}
+                for code, country in self.api.countries.database.items()}
+            for tvg_id, channel in self.api.channels.database.items():
+                key: str = normalize_tvg_id(tvg_id)
+                country: str = channel.country.upper()
+                self.__channels.add(key)
+                self.__countries.setdefault(country, set()).add(key)
+                for lang in channel.languages or spoken.get(country, ()):
+                    self.__languages.setdefault(lang.lower(), set()).add(key)  # noqa:E501
+                for cate in channel.categories:
+                    self.__categories.setdefault(cate.lower(), set()).add(key)  # noqa:E501
+            self.__built = True
+
+    def region(self, code: str) -> Set[str]:
+        '''country codes of region'''
+        self.build()
+        return self.__regions.get(code.upper(), set())
+
+    def country(self, code: str) -> Set[str]:
+        self.build()
+        return self.__countries.get(code.upper(), set())
+
+    def language(self, code: str) -> Set[str]:
+        self.build()
+        return self.__languages.get(self.language_code(code), set())
+
+    def category(self, code: str) -> Set[str]:
+        self.build()
+        return self.__categories.get(code.lower(), set())
+
+    def language_code(self, name_or_code: str) -> str:
+        '''language code of m3u attribute like tvg-language="German"'''
+        key: str = name_or_code.strip().lower()
+        return self.__names.get(key, key)
+
+
+class StreamSelector():
+    '''drop streams during ingestion, before any probe is scheduled'''
+
+    def __init__(self):
+        self.__intlock: Lock = Lock()  # internal lock
+        self.__accepted: int = 0
+        self.__rejected: int = 0
+        self.__saved: Set[str] = set()
+
+    def __str__(self) -> str:
+        return f"select {self.accepted + self.rejected} streams: {self.rejected} dropped ({self.saved} probes saved), {self.accepted} selected"  # noqa:E501
+
+    @property
+    def accepted(self) -> int:
+        return self.__accepted
+
+    @property
+    def rejected(self) -> int:
+        '''dropped streams, never probed'''
+        return self.__rejected
+
+    @property
+    def saved(self) -> int:
+        '''unique urls of dropped streams'''
+        return len(self.__saved)
+
+    def select(self, stream: IPTVStream) -> bool:
+        raise NotImplementedError(f"cannot select stream: {stream}")
+
+    def match(self, stream: IPTVStream) -> bool:
+        matched: bool = self.select(stream)
+        with self.__intlock:
+            if matched:
+                self.__accepted += 1
+            else:
+                self.__rejected += 1
+                self.__saved.add(stream.prober.url)
+        return matched
+
+
+class ChannelSelector(StreamSelector):
+    '''select streams by country, region, language and category before probe,
+    any value of an option matches, all given options must match, unknown
+    regions raise ValueError instead of selecting everything
+    '''
+
+    def __init__(self, index: ChannelIndex,
+                 countries: Iterable[str] = (), regions: Iterable[str] = (),
+                 languages: Iterable[str] = (), categories: Iterable[str] = ()):  # noqa:E501
+        super().__init__()
+        regions = list(regions)
+        self.__index: ChannelIndex = index
+        unknown: List[str] = [r for r in regions if not index.region(r)]
+        if unknown:
+            raise ValueError(f"unknown region: {', '.join(unknown)}")
+        self.__countries: Set[str] = {c.upper() for c in countries}
+        for region in regions:
+            self.__countries.update(index.region(region))
+        self.__by_country: bool = bool(self.__countries or regions)
+        self.__languages: Set[str] = {index.language_code(i) for i in languages}  # noqa:E501
+        self.__categories: Set[str] = {c.lower() for c in categories}
+        dimensions: List[List[Set[str]]] = []
+        if self.__by_country:
+            dimensions.append([index.country(c) for c in self.__countries])
+        if self.__languages:
+            dimensions.append([index.language(i) for i in self.__languages])
+        if self.__categories:
+            dimensions.append([index.category(c) for c in self.__categories])
+        self.__selected: Optional[Set[str]] = None
+        for channels in dimensions:
+            union: Set[str] = set().union(*channels)
+            self.__selected = union if self.__selected is None else self.__selected & union  # noqa:E501
+
+    @property
+    def selected(self) -> Optional[Set[str]]:
+        '''selected channel ids, None selects all'''
+        return self.__selected
+
+    @classmethod
+    def attributes(cls, stream: IPTVStream, key: str) -> Set[str]:
+        return {v.strip() for v in stream.attribute(key).split(";") if v.strip()}  # noqa:E501
+
+    def __match_attributes(self, stream: IPTVStream) -> bool:
+        '''fallback to m3u attributes of channels unknown to iptv-org'''
+        if self.__by_country and not {c.upper() for c in self.attributes(stream, "tvg-country")} & self.__countries:  # noqa:E501
+            return False
+        if self.__languages and not {self.__index.language_code(i) for i in self.attributes(stream, "tvg-language")} & self.__languages:  # noqa:E501
+            return False
+        if self.__categories and not {c.lower() for c in self.attributes(stream, "group-title")} & self.__categories:  # noqa:E501
+            return False
+        return True
+
+    def select(self, stream: IPTVStream) -> bool:
+        if self.__selected is None:
+            return True
+        key: str = normalize_tvg_id(stream.tvg_id)
+        if key in self.__index.channels:
+            return key in self.__selected
+        return self.__match_attributes(stream)
+
+
+class BlocklistSelector(StreamSelector):
+    '''drop channels of iptv-org blocklist, on-disk copy is used even if
+    stale, network is only waited for without any copy
+    '''
+
+    def __init__(self, api: IPTV_ORG_API):
+        super().__init__()
+        self.__blocked: Set[str] = {normalize_tvg_id(c) for c in api.database("blocklist", stale=True)}  # noqa:E501
+
+    def __str__(self) -> str:
+        return f"blocklist {self.accepted + self.rejected} streams: {self.rejected} blocked ({self.saved} probes saved)"  # noqa:E501
+
+    def __len__(self) -> int:
+        return len(self.__blocked)
+
+    def select(self, stream: IPTVStream) -> bool:
+        return normalize_tvg_id(stream.tvg_id) not in self.__blocked
@@ -0,0 +1,295 @@
+# coding:utf-8
+
+from hashlib import blake2b
+from json import dumps
+from json import loads
+import os
+import re
+import socket
+from subprocess import DEVNULL
+from subprocess import Popen
+import sys
+from threading import Lock
+from time import monotonic
+from time import sleep
+from time import time
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Set
+
+from ipytv.m3u import M3U_HEADER_TAG
+from requests import Session
+from xkits import TaskPool
+
+from .metrics import METRICS
+from .selector import StreamSelector
+from .stream import STREAMPROBERS
+from .stream import StreamProber
+from .stream import normalize_url
+from .tuning import Tunes
+
+
+def shard_of(url: str, shards: int) -> int:
+    '''stable shard of normalized url, same in every process and host'''
+    digest: bytes = blake2b(normalize_url(url).encode("utf-8"), digest_size=8).digest()  # noqa:E501
+    return int.from_bytes(digest, "big") % max(1, shards)
+
+
+class ShardQueue():
+    '''file based work queue of url shards in one directory, shared by local
+    worker processes or by several hosts through a shared filesystem
+
+    shard-NNNN.urls is pending, renamed to shard-NNNN.claimed by the worker
+    which probes it, then shard-NNNN.jsonl holds one probe result per line
+    '''
+    MANIFEST = "shards.json"
+    PLAYLIST = "streams.m3u"
+    HEARTBEAT = 10.0  # seconds between touches of claimed shard
+    PATTERN = re.compile(r"^shard-(\d+)\.(urls|claimed|jsonl)$")
+
+    def __init__(self, directory: str):
+        self.__directory: str = os.path.abspath(directory)
+        self.__touched: Dict[int, float] = {}
+        self.__intlock: Lock = Lock()  # internal lock
+        if not os.path.exists(self.__directory):
+            os.makedirs(self.__directory)
+
+    def __str__(self) -> str:
+        return f"shard queue {self.directory}: {self.shards} shards, {len(self.pending)} pending, {len(self.claimed)} claimed, {len(self.done)} done"  # noqa:E501
+
+    @property
+    def directory(self) -> str:
+        return self.__directory
+
+    @property
+    def playlist(self) -> str:
+        '''selected streams of all playlists in original order'''
+        return os.path.join(self.directory, self.PLAYLIST)
+
+    @property
+    def manifest(self) -> Optional[Dict[str, Any]]:
+        '''None until split is complete'''
+        try:
+            with open(os.path.join(self.directory, self.MANIFEST), "r", encoding="utf-8") as rhdl:  # noqa:E501
+                return loads(rhdl.read())
+        except FileNotFoundError:
+            return None
+
+    @property
+    def shards(self) -> int:
+        manifest: Optional[Dict[str, Any]] = self.manifest
+        return 0 if manifest is None else manifest["shards"]
+
+    def path(self, shard: int, state: str) -> str:
+        return os.path.join(self.directory, f"shard-{shard:04d}.{state}")
+
+    def __states(self, state: str) -> List[int]:
+        shards: List[int] = []
+        for name in os.listdir(self.directory):
+            matched = self.PATTERN.match(name)
+            if matched and matched.group(2) == state:
+                shards.append(int(matched.group(1)))
+        return sorted(shards)
+
+    @property
+    def pending(self) -> List[int]:
+        return self.__states("urls")
+
+    @property
+    def claimed(self) -> List[int]:
+        return self.__states("claimed")
+
+    @property
+    def done(self) -> List[int]:
+        return self.__states("jsonl")
+
+    @property
+    def complete(self) -> bool:
+        return self.manifest is not None and len(self.done) >= self.shards
+
+    def __write(self, path: str, lines: Iterable[str]):
+        '''write to temp file and rename into place atomically'''
+        temp: str = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+        with open(temp, "w", encoding="utf-8") as whdl:
+            for line in lines:
+                whdl.write(line)
+                whdl.write("\n")
+            whdl.flush()
+            os.fsync(whdl.fileno())
+        os.replace(temp, path)
+
+    def split(self, playlists: Sequence[str], shards: int,
+              selectors: Sequence[StreamSelector] = (),
+              session: Optional[Session] = None) -> int:
+        '''write selected streams to one local playlist and deduplicated
+        urls of expired probers to shards by stable hash, the manifest is
+        written last, return the number of urls to probe
+        '''
+        shards = max(1, shards)
+        buckets: List[List[str]] = [[] for _ in range(shards)]
+        seen: Set[StreamProber] = set()
+        entries: int = 0
+
+        def iterentries() -> Iterator[str]:
+            nonlocal entries
+            yield M3U_HEADER_TAG
+            for playlist in playlists:
+                for stream in Tunes.iterload(playlist, session=session):
+                    if not all(s.match(stream) for s in selectors):
+                        METRICS.count("streams_dropped")
+                        continue
+                    entries += 1
+                    yield stream.channel.to_m3u_plus_playlist_entry().rstrip("\n")  # noqa:E501
+                    if stream.prober not in seen and stream.prober.expired:
+                        seen.add(stream.prober)
+                        buckets[shard_of(stream.prober.url, shards)].append(stream.prober.url)  # noqa:E501
+
+        self.__write(self.playlist, iterentries())
+        for shard, urls in enumerate(buckets):
+            if urls:
+                self.__write(self.path(shard, "urls"), urls)
+            else:  # nothing to probe
+                self.__write(self.path(shard, "jsonl"), [])
+        self.__write(os.path.join(self.directory, self.MANIFEST),
+                     [dumps({"shards": shards, "streams": entries,
+                             "urls": len(seen), "created": time()})])
+        return len(seen)
+
+    def claim(self) -> Optional[int]:
+        '''take one pending shard, None if nothing is pending'''
+        for shard in self.pending:
+            claimed: str = self.path(shard, "claimed")
+            try:
+                os.rename(self.path(shard, "urls"), claimed)
+            except FileNotFoundError:  # claimed by another worker
+                continue
+            os.utime(claimed)
+            return shard
+        return None
+
+    def urls(self, shard: int) -> List[str]:
+        with open(self.path(shard, "claimed"), "r", encoding="utf-8") as rhdl:  # noqa:E501
+            return [line.strip() for line in rhdl if line.strip()]
+
+    def touch(self, shard: int):
+        '''heartbeat of claimed shard, stale shards are requeued'''
+        with self.__intlock:
+            if monotonic() - self.__touched.get(shard, 0.0) < self.HEARTBEAT:
+                return
+            self.__touched[shard] = monotonic()
+        try:
+            os.utime(self.path(shard, "claimed"))
+        except FileNotFoundError:  # requeued, results are still welcome
+            pass
+
+    def finish(self, shard: int, records: Iterable[Dict[str, Any]]):
+        self.__write(self.path(shard, "jsonl"), (dumps(r) for r in records))
+        try:
+            os.remove(self.path(shard, "claimed"))
+        except FileNotFoundError:
+            pass
+
+    def requeue(self, stale: float) -> int:
+        '''pending again if claimed shard has no heartbeat for stale seconds'''
+        requeued: int = 0
+        for shard in self.claimed:
+            claimed: str = self.path(shard, "claimed")
+            try:
+                if time() - os.stat(claimed).st_mtime < stale or os.path.exists(self.path(shard, "jsonl")):  # noqa:E501
+                    continue
+                os.rename(claimed, self.path(shard, "urls"))
+                requeued += 1
+            except FileNotFoundError:  # finished meanwhile
+                continue
+        return requeued
+
+    def results(self) -> Iterator[Dict[str, Any]]:
+        '''probe results of all finished shards'''
+        for shard in self.done:
+            with open(self.path(shard, "jsonl"), "r", encoding="utf-8") as rhdl:  # noqa:E501
+                for line in rhdl:
+                    if line.strip():
+                        yield loads(line)
+
+    def merge(self) -> int:
+        '''load probe results of all shards into shared probers'''
+        merged: int = 0
+        for record in self.results():
+            STREAMPROBERS.load(record)
+            merged += 1
+        METRICS.gauge("shard_results", merged)
+        return merged
+
+
+class ShardTask(TaskPool):
+    '''worker of shard queue, probe claimed shards until none is pending'''
+    QUEUE_FACTOR = 4  # bounded jobs per worker for backpressure
+    POLL = 1.0  # seconds between checks of shard queue
+
+    def __init__(self, workers: int = 8, timeout: float = 3.0):
+        super().__init__(workers=workers, jobs=workers * self.QUEUE_FACTOR,
+                         prefix="shard_task")
+        self.__timeout: float = max(1.0, timeout)
+        self.__shards: int = 0
+        self.__urls: int = 0
+
+    def __str__(self) -> str:
+        return f"shard worker {os.getpid()}: {self.shards} shards, {self.urls} urls probed"  # noqa:E501
+
+    @property
+    def timeout(self) -> float:
+        return self.__timeout
+
+    @property
+    def shards(self) -> int:
+        return self.__shards
+
+    @property
+    def urls(self) -> int:
+        return self.__urls
+
+    def __probe_task(self, queue: ShardQueue, shard: int, prober: StreamProber):  # noqa:E501
+        try:
+            prober.data  # pylint: disable=pointless-statement
+        finally:
+            queue.touch(shard)
+
+    def work(self, queue: ShardQueue) -> int:
+        '''probe pending shards, return the number of finished shards'''
+        finished: int = 0
+        while True:
+            shard: Optional[int] = queue.claim()
+            if shard is None:
+                return finished
+            probers: List[StreamProber] = [STREAMPROBERS.alloc(url, self.timeout) for url in queue.urls(shard)]  # noqa:E501
+            for prober in probers:
+                self.submit(self.__probe_task, queue, shard, prober)
+            self.barrier()
+            self.clear()  # forget finished jobs
+            queue.finish(shard, (p.dump() for p in probers))
+            self.__shards += 1
+            self.__urls += len(probers)
+            finished += 1
+            self.cmds.stderr(f"shard {shard}: {len(probers)} urls probed")
+
+    @classmethod
+    def spawn(cls, queue: ShardQueue, argv: Sequence[str], processes: int) -> List[Popen]:  # noqa:E501
+        '''local worker processes of `kittv shard` on the same queue'''
+        command: List[str] = [sys.executable, "-m", "kittv", "shard"] + list(argv) + [queue.directory]  # noqa:E501
+        return [Popen(command, stdout=DEVNULL) for _ in range(max(0, processes))]  # noqa:E501
+
+    def wait(self, queue: ShardQueue, stale: float, processes: Sequence[Popen] = ()):  # noqa:E501
+        '''until all shards are done, requeue stale shards of lost workers,
+        probe pending shards here after local worker processes exited
+        '''
+        while not queue.complete:
+            queue.requeue(stale)
+            if any(p.poll() is None for p in processes) or self.work(queue) == 0:  # noqa:E501
+                sleep(self.POLL)
+        for process in processes:
+            process.wait()
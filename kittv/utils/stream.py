@@ -1,24 +1,90 @@
 # coding:utf-8
 
+import asyncio
+import sys
+from threading import Lock
+from time import monotonic
+from time import time
 from typing import Any
 from typing import Dict
 from typing import Iterator
 from typing import Optional
+from typing import Tuple
+from typing import Union
+from urllib.parse import parse_qsl
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+from urllib.parse import urlunsplit
 
 from ffmpeg import Error as fferror
-from ffmpeg import probe as ffprobe
 from ipytv.playlist import IPTVAttr
 from ipytv.playlist import IPTVChannel
 from xkits import CacheAtom
 from xkits import singleton
 
+from .aioprobe import ASYNCPROBES
+from .aioprobe import AsyncProbe
+from .aioprobe import AsyncProbeError
+from .aioprobe import AsyncProbeStale
+from .aioprobe import AsyncProbeTimeout
+from .aioprobe import AsyncProbeUnreachable
+from .database import ProbeDatabase
+from .ffprobe import FFPROBES
+from .ffprobe import FFProbeTimeout
+from .hls import HLSRESOLVER
+from .hosts import HOSTS
+from .hosts import unreachable_stderr
+from .metrics import LIFETIME_BUCKETS
+from .metrics import METRICS
+from .metrics import RATE_BUCKETS
+from .metrics import TIMEOUT_BUCKETS
+from .options import PROBE_BACKENDS
+from .precheck import StreamPrecheck
+from .throughput import ThroughputMeter
+
+DEFAULT_PORTS: Dict[str, int] = {"http": 80, "https": 443, "rtsp": 554, "rtmp": 1935}  # noqa:E501
+QUERY_NOISES: Tuple[str, ...] = ("utm_", "fbclid", "gclid")
+
+
+def normalize_url(url: str) -> str:
+    '''normalize scheme and host case, default port and query noise'''
+    try:
+        parts = urlsplit(url.strip())
+        scheme: str = parts.scheme.lower()
+        host: str = (parts.hostname or "").lower()
+        port: Optional[int] = parts.port
+    except ValueError:
+        return url.strip()
+    if not scheme or not host:
+        return url.strip()
+    if ":" in host:  # IPv6
+        host = f"[{host}]"
+    if port is not None and DEFAULT_PORTS.get(scheme) != port:
+        host = f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username if parts.password is None else f"{parts.username}:{parts.password}"  # noqa:E501
+        host = f"{userinfo}@{host}"
+    query: str = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)  # noqa:E501
+                            if k and not k.lower().startswith(QUERY_NOISES)])
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
 
 class StreamProber():
     MINIMUM = 1800  # 30 minutes
     DEFAULT = 10800  # 3 hours
     MAXIMUM = 86400  # 1 day
+    DEAD_FAILURES = 3  # consecutive failures to back off re-probes
+    TRIPPED = 1.0  # minimum seconds of fast-failed result, 0 never expires
+    BACKENDS = PROBE_BACKENDS
+    COMPACT_KEYS = ("format_name", "probe_score", "download_rate")
+    __slots__ = ("__cache", "__timeout", "__lifetime", "__success",
+                 "__database", "__precheck", "__backend", "__compact",
+                 "__throughput", "__outcome", "__latency", "__failures",
+                 "__reliability", "__lock", "__url")
 
     class Format:
+        __slots__ = ("__data",)
+
         def __init__(self, data: Dict[str, Any]):
             self.__data: Dict[str, Any] = data
 
@@ -26,12 +92,33 @@ class StreamProber():
         def probe_score(self) -> int:
             return self.__data.get("probe_score", 0)
 
-    def __init__(self, url: str, timeout: float):
-        self.__ffprobe: Optional[CacheAtom[Dict[str, Any]]] = None
+        @property
+        def download_rate(self) -> float:
+            '''bytes per second, 0 if not measured or failed'''
+            return self.__data.get("download_rate", 0.0)
+
+    def __init__(self, url: str, timeout: float, backend: str = "ffprobe",
+                 database: Optional[ProbeDatabase] = None,
+                 precheck: Optional[StreamPrecheck] = None,
+                 compact: bool = False, throughput: float = 0.0):
+        assert backend in self.BACKENDS, f"unknown probe backend: {backend}"
+        self.__cache: Optional[CacheAtom[Any]] = None
         self.__timeout: float = max(1.0, timeout)  # probe timeout
         self.__lifetime: float = self.DEFAULT  # data lifetime
         self.__success: bool = False
+        self.__database: Optional[ProbeDatabase] = database
+        self.__precheck: Optional[StreamPrecheck] = precheck
+        self.__backend: str = backend
+        self.__compact: bool = compact
+        self.__throughput: float = max(0.0, throughput)
+        self.__outcome: str = ""
+        self.__latency: float = 0.0
+        self.__failures: int = 0  # consecutive unavailable probes
+        self.__reliability: Optional[ProbeDatabase.RELIABILITY] = None
+        self.__lock: Lock = Lock()
         self.__url: str = url
+        if database is not None:
+            self.restore(database)
 
     def __str__(self) -> str:
         return f"IPTV Stream Prober URL={self.url}"
@@ -41,29 +128,305 @@ class StreamProber():
         return self.__url
 
     @property
-    def ffprobe(self) -> Dict[str, Any]:
-        if self.__ffprobe is None or self.__ffprobe.expired:
+    def key(self) -> str:
+        '''normalized url, key of shared probers and of probe database'''
+        return normalize_url(self.url)
+
+    @property
+    def backend(self) -> str:
+        return self.__backend
+
+    @property
+    def compact(self) -> bool:
+        '''only keep format name and probe score of probe data'''
+        return self.__compact
+
+    @property
+    def throughput(self) -> float:
+        '''seconds of download to measure rate, 0 is disabled'''
+        return self.__throughput
+
+    @property
+    def timeout(self) -> float:
+        return self.__timeout
+
+    @property
+    def lifetime(self) -> float:
+        return self.__lifetime
+
+    @property
+    def success(self) -> bool:
+        return self.__success
+
+    @property
+    def outcome(self) -> str:
+        '''outcome of the last probe in this process, empty if never probed'''  # noqa:E501
+        return self.__outcome
+
+    @property
+    def latency(self) -> float:
+        '''seconds of the last probe in this process'''
+        return self.__latency
+
+    @property
+    def reliability(self) -> Optional[ProbeDatabase.RELIABILITY]:
+        '''rolling probe history of url, None without database'''
+        return self.__reliability
+
+    @property
+    def uptime(self) -> float:
+        '''smoothed rolling uptime, 0.5 if never probed'''
+        reliability = self.__reliability
+        if reliability is None:
+            return 0.5
+        return (reliability.uptime * reliability.probes + 1) / (reliability.probes + 2)  # noqa:E501
+
+    @property
+    def expected_latency(self) -> float:
+        '''median latency of available probes, timeout if unknown'''
+        reliability = self.__reliability
+        if reliability is None or reliability.p50 <= 0:
+            return self.__timeout
+        return reliability.p50
+
+    @property
+    def failures(self) -> int:
+        return self.__failures
+
+    @property
+    def expired(self) -> bool:
+        return self.__cache is None or self.__cache.expired
+
+    @property
+    def expires(self) -> float:
+        '''time when probe data expires, now if never probed'''
+        if self.__cache is None:
+            return time()
+        return self.__cache.up + self.__cache.life
+
+    @property
+    def last(self) -> Dict[str, Any]:
+        '''last probe data even if expired, never probe'''
+        cache: Optional[CacheAtom[Any]] = self.__cache
+        return {} if cache is None else self.__unpack(cache.data)
+
+    def restore(self, database: ProbeDatabase):
+        '''restore timeout, lifetime, history and still fresh data from database'''  # noqa:E501
+        self.__reliability = database.reliability(self.key, IPTVStream.MIN_SCORE)  # noqa:E501
+        self.__failures = self.__reliability.failures
+        record = database.load(self.key)
+        if record is not None:
+            self.__timeout = record.timeout
+            self.__lifetime = record.lifetime
+            self.__success = record.success
+            measured: bool = not self.throughput or not record.success or "download_rate" in record.data.get("format", {})  # noqa:E501
+            if record.expires > time() and measured:
+                self.__cache = CacheAtom(data=self.__pack(record.data),
+                                         lifetime=record.expires - time())
+
+    def dump(self) -> Dict[str, Any]:
+        '''mergeable probe result, fields of probe database and history'''
+        data: Dict[str, Any] = self.last
+        return {"url": self.url, "data": data, "success": self.success,
+                "timeout": self.timeout, "lifetime": self.lifetime,
+                "expires": self.expires,
+                "score": self.Format(data.get("format", {})).probe_score,
+                "latency": round(self.latency, 3), "outcome": self.outcome}
+
+    def load(self, record: Dict[str, Any]):
+        '''merge probe result dumped by another process, fresh until expires,
+        a fast-fail of tripped host is neither history nor persisted
+        '''
+        tripped: bool = record["outcome"] == "tripped"
+        with self.__lock:
+            self.__timeout = record["timeout"]
+            self.__lifetime = record["lifetime"]
+            self.__success = record["success"]
+            self.__outcome = record["outcome"]
+            self.__latency = record["latency"]
+            if not tripped:
+                self.__failures = 0 if record["score"] >= IPTVStream.MIN_SCORE else self.__failures + 1  # noqa:E501
+            if record["expires"] > time():  # lifetime 0 never expires
+                self.__cache = CacheAtom(data=self.__pack(record["data"]),
+                                         lifetime=record["expires"] - time())  # noqa:E501
+        if self.__database is not None and not tripped:
+            self.__database.save(self.key, record["data"], self.success,
+                                 self.timeout, self.lifetime, record["expires"])  # noqa:E501
+            if self.outcome:  # probed, not restored from cache of shard
+                self.__database.record(self.key, record["score"],
+                                       self.latency, self.outcome)
+            self.__reliability = self.__database.reliability(self.key, IPTVStream.MIN_SCORE)  # noqa:E501
+
+    def __pack(self, data: Dict[str, Any]) -> Any:
+        '''fixed-size record instead of full probe data in compact mode'''
+        if not self.compact:
+            return data
+        fmt: Dict[str, Any] = data.get("format", {})
+        return tuple(fmt.get(k) for k in self.COMPACT_KEYS)
+
+    def __unpack(self, cache: Any) -> Dict[str, Any]:
+        if not self.compact:
+            return cache
+        return {"format": {k: v for k, v in zip(self.COMPACT_KEYS, cache)
+                           if v is not None}}
+
+    def update(self, data: Dict[str, Any], success: bool) -> Dict[str, Any]:
+        '''cache probe data, record history and adapt timeout and lifetime,
+        consistently dead urls are probed less often
+        '''
+        score: int = self.Format(data.get("format", {})).probe_score
+        self.__failures = 0 if score >= IPTVStream.MIN_SCORE else self.__failures + 1  # noqa:E501
+        lifetime: float = self.__lifetime
+        if self.__failures >= self.DEAD_FAILURES:
+            lifetime = min(lifetime * 2 ** (self.__failures - self.DEAD_FAILURES + 1), self.MAXIMUM)  # noqa:E501
+            METRICS.count("probes_backoff")
+        self.__cache = CacheAtom(data=self.__pack(data), lifetime=lifetime)
+        expires: float = time() + lifetime
+        self.__success = success
+        self.__timeout = min(self.__timeout if self.__success else self.__timeout + 0.5, 30.0)  # noqa:E501
+        self.__lifetime *= 1.15 if self.__success or self.__timeout >= 30 else 0.85  # noqa:E501
+        self.__lifetime = min(max(self.__lifetime, self.MINIMUM), self.MAXIMUM)  # noqa:E501
+        METRICS.observe("prober_timeout_seconds", self.__timeout, TIMEOUT_BUCKETS)  # noqa:E501
+        METRICS.observe("prober_lifetime_seconds", self.__lifetime, LIFETIME_BUCKETS)  # noqa:E501
+        if self.__database is not None:  # full data, not packed in memory
+            self.__database.save(self.key, data, success, self.__timeout,
+                                 self.__lifetime, expires)
+            self.__database.record(self.key, score, self.__latency,
+                                   self.__outcome or "success")
+            self.__reliability = self.__database.reliability(self.key, IPTVStream.MIN_SCORE)  # noqa:E501
+        return self.__unpack(self.__cache.data)
+
+    def measure(self, started: float, outcome: str):
+        '''probe latency by outcome: success, timeout, stale, unreachable,
+        error, rejected or tripped
+        '''
+        self.__latency = monotonic() - started
+        self.__outcome = outcome
+        METRICS.observe("probe_seconds", self.__latency, outcome=outcome)
+        METRICS.count("probes", outcome=outcome)
+
+    def __trip(self) -> Dict[str, Any]:
+        '''fast-fail while circuit of host is open, keep timeout and lifetime,
+        retry after cooldown of circuit
+        '''
+        self.measure(monotonic(), "tripped")
+        self.__cache = CacheAtom(data=self.__pack({}), lifetime=max(HOSTS.cooldown, self.TRIPPED))  # noqa:E501
+        self.__success = False
+        return self.__unpack(self.__cache.data)
+
+    def __fail(self, started: float, outcome: str, reachable: Optional[bool]) -> Tuple[Dict[str, Any], bool]:  # noqa:E501
+        '''reachable is None if unknown, e.g. ffprobe killed after deadline'''
+        self.measure(started, outcome)
+        if reachable is not None:
+            HOSTS.report(self.url, reachable)
+        return {}, False
+
+    def __afail(self, started: float, error: AsyncProbeError) -> Tuple[Dict[str, Any], bool]:  # noqa:E501
+        '''outcome and host reachability by error of asyncio probe'''
+        if isinstance(error, AsyncProbeTimeout):  # connected, then timed out
+            return self.__fail(started, "timeout", True)
+        if isinstance(error, AsyncProbeStale):
+            return self.__fail(started, "stale", True)
+        if isinstance(error, AsyncProbeUnreachable):
+            return self.__fail(started, "unreachable", False)
+        return self.__fail(started, "error", True)
+
+    def __ffprobe(self) -> Tuple[Dict[str, Any], bool]:
+        started: float = monotonic()
+        if self.__precheck is not None and not self.__precheck.check(self.url, self.__timeout):  # noqa:E501
+            self.measure(started, "rejected")
+            return {}, False
+        url: str = self.url
+        if HLSRESOLVER.suspect(url):  # ffprobe only one segment of HLS
             try:
-                data = ffprobe(self.url, timeout=int(self.__timeout * 1000000))
-                self.__ffprobe = CacheAtom(data=data, lifetime=self.__lifetime)
-                self.__success = True
-            except fferror:
-                self.__ffprobe = CacheAtom(data={}, lifetime=self.__lifetime)
-                self.__success = False
-            finally:
-                self.__timeout = min(self.__timeout if self.__success else self.__timeout + 0.5, 30.0)  # noqa:E501
-                self.__lifetime *= 1.15 if self.__success or self.__timeout >= 30 else 0.85  # noqa:E501
-        return self.__ffprobe.data
+                url = ASYNCPROBES.run(AsyncProbe(url, self.__timeout).locate())  # noqa:E501
+            except AsyncProbeError as error:
+                return self.__afail(started, error)
+        try:
+            data: Dict[str, Any] = FFPROBES.probe(url, self.__timeout)
+        except FFProbeTimeout:
+            return self.__fail(started, "timeout", None)
+        except fferror as error:
+            if unreachable_stderr(error.stderr):
+                return self.__fail(started, "unreachable", False)
+            return self.__fail(started, "error", True)
+        self.measure(started, "success")
+        HOSTS.report(self.url, True)
+        return data, True
+
+    async def ameasure(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        '''add sustained download rate to format of successful probe data'''
+        if self.throughput <= 0 or "format" not in data or not ThroughputMeter.supported(self.url):  # noqa:E501
+            return data
+        try:
+            meter = ThroughputMeter(self.url, self.__timeout, self.throughput)  # noqa:E501
+            rate: float = await meter.measure()
+            METRICS.count("throughput_measures", outcome="success")
+            METRICS.observe("download_rate_bytes_per_second", rate,
+                            RATE_BUCKETS)
+        except AsyncProbeTimeout:
+            METRICS.count("throughput_measures", outcome="timeout")
+            rate = 0.0
+        except AsyncProbeError:
+            METRICS.count("throughput_measures", outcome="error")
+            rate = 0.0
+        return {**data, "format": {**data["format"], "download_rate": rate}}
+
+    async def aprobe(self) -> Dict[str, Any]:
+        '''probe stream in the running event loop (asyncio backend)'''
+        if self.expired:
+            if not HOSTS.allow(self.url):
+                return self.__trip()
+            if not AsyncProbe.supported(self.url):  # fallback to ffprobe
+                loop = asyncio.get_running_loop()
+                return self.update(*await loop.run_in_executor(None, self.__ffprobe))  # noqa:E501
+            started: float = monotonic()
+            try:
+                data = await AsyncProbe(self.url, self.__timeout).probe()
+            except AsyncProbeError as error:
+                return self.update(*self.__afail(started, error))
+            self.measure(started, "success")
+            HOSTS.report(self.url, True)
+            return self.update(await self.ameasure(data), True)
+        return self.data
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        '''probe data, refresh by selected backend when expired'''
+        if self.expired:
+            with self.__lock:  # avoid concurrent probes of the same url
+                if self.expired:
+                    if self.backend == "asyncio":
+                        return ASYNCPROBES.run(self.aprobe())
+                    if not HOSTS.allow(self.url):
+                        return self.__trip()
+                    data, success = self.__ffprobe()
+                    if success and self.throughput > 0:
+                        data = ASYNCPROBES.run(self.ameasure(data))
+                    return self.update(data, success)
+        assert self.__cache is not None
+        return self.__unpack(self.__cache.data)
+
+    @property
+    def ffprobe(self) -> Dict[str, Any]:
+        '''same as data'''
+        return self.data
 
     @property
     def format(self) -> Format:
-        return self.Format(self.ffprobe.get("format", {}))
+        return self.Format(self.data.get("format", {}))
 
 
 @singleton
 class StreamProberPool():
     def __init__(self):
         self.__probers: Dict[str, StreamProber] = {}
+        self.__intlock: Lock = Lock()  # internal lock
+        self.__backend: str = "ffprobe"
+        self.__database: Optional[ProbeDatabase] = None
+        self.__precheck: Optional[StreamPrecheck] = None
+        self.__compact: bool = False
+        self.__throughput: float = 0.0
 
     def __len__(self) -> int:
         return len(self.__probers)
@@ -72,29 +435,147 @@ class StreamProberPool():
         return iter(self.__probers.values())
 
     def __getitem__(self, url: str) -> StreamProber:
-        return self.__probers[url]
+        return self.__probers[normalize_url(url)]
 
     def __contains__(self, url: str) -> bool:
-        return url in self.__probers
+        return normalize_url(url) in self.__probers
+
+    @property
+    def backend(self) -> str:
+        '''probe backend of new allocated probers'''
+        return self.__backend
+
+    @backend.setter
+    def backend(self, backend: str):
+        assert backend in StreamProber.BACKENDS, f"unknown probe backend: {backend}"  # noqa:E501
+        self.__backend = backend
+
+    @property
+    def database(self) -> Optional[ProbeDatabase]:
+        '''persistent probe results of new allocated probers'''
+        return self.__database
+
+    @database.setter
+    def database(self, database: Optional[ProbeDatabase]):
+        self.__database = database
+
+    @property
+    def precheck(self) -> Optional[StreamPrecheck]:
+        '''http pre-check of new allocated probers before ffprobe'''
+        return self.__precheck
+
+    @precheck.setter
+    def precheck(self, precheck: Optional[StreamPrecheck]):
+        self.__precheck = precheck
+
+    @property
+    def compact(self) -> bool:
+        '''compact memory representation of new allocated streams'''
+        return self.__compact
+
+    @compact.setter
+    def compact(self, compact: bool):
+        self.__compact = compact
+
+    @property
+    def throughput(self) -> float:
+        '''seconds of download rate measurement of new allocated probers'''
+        return self.__throughput
+
+    @throughput.setter
+    def throughput(self, throughput: float):
+        self.__throughput = max(0.0, throughput)
+
+    def load(self, record: Dict[str, Any]) -> StreamProber:
+        '''merge probe result of StreamProber.dump into shared prober'''
+        prober: StreamProber = self.alloc(record["url"], record["timeout"])
+        prober.load(record)
+        return prober
 
     def alloc(self, url: str, timeout: float) -> StreamProber:
-        if url not in self.__probers:
-            self.__probers.setdefault(url, StreamProber(url, timeout))
-        return self.__probers[url]
+        '''share one prober between streams of the same normalized url'''
+        key: str = normalize_url(url)
+        try:
+            return self.__probers[key]
+        except KeyError:
+            with self.__intlock:
+                if key not in self.__probers:
+                    prober = StreamProber(url, timeout, self.backend,
+                                          self.database, self.precheck,
+                                          self.compact, self.throughput)
+                    self.__probers.setdefault(key, prober)
+                return self.__probers[key]
 
 
 STREAMPROBERS: StreamProberPool = StreamProberPool()
 
 
+class CompactChannel():
+    '''IPTVChannel with interned strings and tuple attributes'''
+    __slots__ = ("__url", "__name", "__duration", "__attributes", "__extras")
+
+    def __init__(self, channel: IPTVChannel):
+        self.__url: str = channel.url
+        self.__name: str = sys.intern(channel.name)
+        self.__duration: str = sys.intern(str(channel.duration))
+        self.__attributes: Tuple[str, ...] = tuple(  # key, value, ...
+            sys.intern(i) for kv in channel.attributes.items() for i in kv)
+        self.__extras: Tuple[str, ...] = tuple(
+            sys.intern(e) for e in channel.extras)
+
+    @property
+    def url(self) -> str:
+        return self.__url
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def attributes(self) -> Dict[str, str]:
+        return dict(zip(self.__attributes[::2], self.__attributes[1::2]))
+
+    def get(self, key: str, default: str = "") -> str:
+        for i in range(0, len(self.__attributes), 2):
+            if self.__attributes[i] == key:
+                return self.__attributes[i + 1]
+        return default
+
+    @property
+    def channel(self) -> IPTVChannel:
+        return IPTVChannel(url=self.__url, name=self.__name,
+                           duration=self.__duration,
+                           attributes=self.attributes,
+                           extras=list(self.__extras))
+
+
 class IPTVStream():
+    MIN_SCORE = 90
+    __slots__ = ("__prober", "__channel")
 
     def __init__(self, channel: IPTVChannel, timeout: float = 3.0):
         self.__prober: StreamProber = STREAMPROBERS.alloc(channel.url, timeout)
-        self.__channel: IPTVChannel = channel
+        self.__channel: Union[IPTVChannel, CompactChannel] = CompactChannel(
+            channel) if STREAMPROBERS.compact else channel
 
     def __str__(self) -> str:
         return f"IPTVStream {self.name} URL={self.url}"
 
+    @property
+    def prober(self) -> StreamProber:
+        return self.__prober
+
+    @property
+    def channel(self) -> IPTVChannel:
+        if isinstance(self.__channel, CompactChannel):
+            return self.__channel.channel
+        return self.__channel
+
+    def attribute(self, key: str, default: str = "") -> str:
+        if isinstance(self.__channel, CompactChannel):
+            return self.__channel.get(key, default)
+        return self.__channel.attributes.get(key, default)
+
     @property
     def url(self) -> str:
         return self.__channel.url
@@ -105,18 +586,29 @@ class IPTVStream():
 
     @property
     def tvg_id(self) -> str:
-        return self.__channel.attributes.get(IPTVAttr.TVG_ID.value, "")
+        return self.attribute(IPTVAttr.TVG_ID.value)
 
     @property
     def tvg_name(self) -> str:
-        return self.__channel.attributes.get(IPTVAttr.TVG_NAME.value, "")
+        return self.attribute(IPTVAttr.TVG_NAME.value)
 
     @property
     def available(self) -> bool:
         '''stream is available'''
-        return self.score >= 90
+        return self.score >= self.MIN_SCORE
+
+    @property
+    def last_available(self) -> bool:
+        '''stream was available at the last probe, never probe'''
+        fmt: Dict[str, Any] = self.__prober.last.get("format", {})
+        return StreamProber.Format(fmt).probe_score >= self.MIN_SCORE
 
     @property
     def score(self) -> int:
         """probe score"""
         return self.__prober.format.probe_score
+
+    @property
+    def rate(self) -> float:
+        '''download rate in bytes per second'''
+        return self.__prober.format.download_rate
@@ -1,32 +1,103 @@
 # coding:utf-8
 
+from heapq import heappop
+from heapq import heappush
+from itertools import count
+from json import dumps
 from queue import Empty
 from queue import Queue
+from threading import Condition
+from threading import Lock
+from threading import Semaphore
+from time import monotonic
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
 
+from requests import Session
+from requests.adapters import HTTPAdapter
 from xkits import TaskPool
 
+from .aioprobe import ASYNCPROBES
+from .hosts import HostSlots
+from .hosts import host_of
+from .metrics import METRICS
+from .options import BEST_MODES
+from .selector import StreamSelector
 from .stream import IPTVStream
+from .stream import STREAMPROBERS
+from .stream import StreamProber
 from .tuning import Tunes
 
 
 class PlaylistTask(TaskPool):
-    def __init__(self, probe: bool = False, filter: bool = False):
+    QUEUE_FACTOR = 4  # bounded jobs per worker for backpressure
+    MERGE_BATCH = 1024  # maximum streams merged at once
+    # minimum download rate (bytes per second) of tiered playlists
+    TIERS: Tuple[Tuple[str, int], ...] = (("useful", 200 * 1024),
+                                          ("good", 500 * 1024),
+                                          ("wonderful", 700 * 1024),
+                                          ("excellent", 1024 * 1024))
+    BEST = BEST_MODES  # race mode of one stream per channel
+    MIN_HISTORY = 3  # probes in history to judge reliability
+
+    def __init__(self, probe: bool = False, filter: bool = False,
+                 min_rate: float = 0.0, tiers: bool = False,
+                 selectors: Sequence[StreamSelector] = (),
+                 host_limit: int = 0, best: str = "", budget: float = 0.0,
+                 min_uptime: float = 0.0, by_uptime: bool = False):
         super().__init__(workers=1, prefix="merge_task")
-        self.__streams: Queue[IPTVStream] = Queue()
-        self.__playlists: Tunes = Tunes()
-        self.__check: bool = probe or filter
+        self.__streams: Queue[Optional[IPTVStream]] = Queue()
+        self.__ready: Queue[Optional[StreamProber]] = Queue()  # deferred
+        self.__hosts: HostSlots[StreamProber] = HostSlots(host_limit)
+        self.__outstanding: int = 0  # unique probes not fanned out yet
+        self.__running: int = 0  # dispatched probes not fanned out yet
+        self.__loading: int = 0  # playlists still loading
+        self.__drained: Condition = Condition()
+        self.__pending: List[Tuple[Tuple[int, float, int, float], int, StreamProber]] = []  # heap  # noqa:E501
+        self.__ranks: Dict[str, int] = {}  # scheduled probes per channel
+        self.__rank: Dict[StreamProber, int] = {}  # candidate rank in channel
+        self.__sequence: Iterator[int] = count()  # tie breaker of heap
+        self.__verified: Set[str] = set()  # channels with available stream
+        self.__unprobed: Tunes = Tunes()  # skipped when budget expired
+        self.__budget: float = max(0.0, budget)
+        self.__deadline: float = 0.0
+        self.__playlists: Tunes = Tunes(by_uptime)
+        self.__min_uptime: float = min(max(0.0, min_uptime), 1.0)
+        self.__waiting: Dict[StreamProber, List[IPTVStream]] = {}
+        self.__intlock: Lock = Lock()  # internal lock
+        self.__scheduled: int = 0
+        self.__unique: int = 0
+        self.__inflight: Semaphore = Semaphore()
+        self.__fanouts: TaskPool = TaskPool(prefix="fanout_task")
+        self.__tiers: Dict[str, Tunes] = {name: Tunes(by_uptime) for name, _ in self.TIERS} if tiers else {}  # noqa:E501
+        self.__min_rate: float = max(0.0, min_rate)
+        self.__selectors: Sequence[StreamSelector] = selectors
+        assert best in self.BEST, f"unknown best stream mode: {best}"
+        # streams to race by playlist index and position, in load order
+        self.__candidates: List[Tuple[int, int, IPTVStream]] = []
+        self.__best: str = best
+        self.__check: bool = probe or filter or min_rate > 0 or tiers or bool(best)  # noqa:E501
         self.__probe: bool = probe
-        self.__filter: bool = filter
+        self.__filter: bool = filter or min_rate > 0
 
     def __enter__(self):
         self.submit(self.__merge_task)
         super().__enter__()
         return self
 
+    def shutdown(self) -> None:
+        self.streams.put(None)  # notice merge task after all streams
+        super().shutdown()
+
     @property
-    def streams(self) -> Queue[IPTVStream]:
+    def streams(self) -> Queue[Optional[IPTVStream]]:
         return self.__streams
 
     @property
@@ -41,40 +112,464 @@ class PlaylistTask(TaskPool):
     def filter(self) -> bool:
         return self.__filter
 
+    @property
+    def min_rate(self) -> float:
+        '''minimum download rate in bytes per second of filter'''
+        return self.__min_rate
+
+    @property
+    def min_uptime(self) -> float:
+        '''drop streams with lower rolling uptime before probe, 0 is disabled'''  # noqa:E501
+        return self.__min_uptime
+
+    @property
+    def budget(self) -> float:
+        '''seconds of probe run, 0 is unlimited'''
+        return self.__budget
+
+    @property
+    def remaining(self) -> float:
+        '''seconds left to start probes'''
+        if self.budget <= 0:
+            return float("inf")
+        return max(0.0, self.__deadline - monotonic())
+
+    @property
+    def unprobed(self) -> Tunes:
+        '''streams not probed before budget expired'''
+        return self.__unprobed
+
+    @property
+    def best(self) -> str:
+        '''only first (or fastest) available stream per channel, empty is all'''  # noqa:E501
+        return self.__best
+
+    @property
+    def selectors(self) -> Sequence[StreamSelector]:
+        '''drop streams before probe, all must match'''
+        return self.__selectors
+
+    @property
+    def host_limit(self) -> int:
+        '''maximum concurrent probes per host, 0 is unlimited'''
+        return self.__hosts.limit
+
     @property
     def playlists(self) -> Tunes:
         return self.__playlists
 
+    @property
+    def tiers(self) -> Dict[str, Tunes]:
+        '''playlists of streams faster than each tier'''
+        return self.__tiers
+
+    @property
+    def dedup_ratio(self) -> float:
+        '''scheduled streams per unique probed url'''
+        return self.__scheduled / self.__unique if self.__unique > 0 else 1.0
+
     def __merge_task(self):
         '''merge streams into new playlist'''
         while True:
-            try:
-                stream: IPTVStream = self.streams.get(timeout=0.01)
+            batch: List[IPTVStream] = []
+            stream: Optional[IPTVStream] = self.streams.get(block=True)
+            while stream is not None:
+                batch.append(stream)
+                if len(batch) >= self.MERGE_BATCH:
+                    break
+                try:
+                    stream = self.streams.get_nowait()
+                except Empty:
+                    break
+            if batch:
+                self.__merge_batch(batch)
+            if stream is None:  # all streams are merged
+                break
+
+    def __merge_batch(self, streams: List[IPTVStream]):
+        with METRICS.timer("merge_seconds"):
+            lines: List[str] = []
+            for stream in streams:
                 items: List[str] = [stream.name, stream.url]
                 if self.probe:
                     items.append("good" if stream.available else "bad")
-                self.cmds.stdout(", ".join(items))
-                self.playlists.append(stream)
+                    if stream.prober.throughput > 0:
+                        items.append(f"{stream.rate / 1024:.0f} KiB/s")
+                lines.append(", ".join(items))
+            self.cmds.stdout("\n".join(lines))
+            self.playlists.extend(streams)
+            for name, rate in self.TIERS:
+                if name in self.tiers:
+                    self.tiers[name].extend([s for s in streams if s.rate > rate])  # noqa:E501
+        METRICS.count("streams_merged", len(streams))
+
+    def __check_task(self, stream: IPTVStream, queued: Optional[float] = None):  # noqa:E501
+        '''check stream availability, drop stream if the check failed'''
+        if queued is not None:
+            METRICS.observe("queue_wait_seconds", monotonic() - queued, stage="check")  # noqa:E501
+        try:
+            available: bool = self.check and stream.available
+            accepted: bool = not self.check or not self.filter or self.__accept(stream)  # noqa:E501
+        except Exception as error:  # pylint: disable=broad-except
+            METRICS.count("streams_failed")
+            self.cmds.stderr(f"failed to check {stream.url}: {error}")
+            return
+        if not accepted:
+            METRICS.count("streams_filtered")
+            return
+        if self.budget > 0 and available and stream.tvg_id:
+            self.__verified.add(stream.tvg_id)
+        self.streams.put(stream, block=True)
+
+    def __accept(self, stream: IPTVStream) -> bool:
+        return stream.available and stream.rate >= self.min_rate
+
+    def __fanout_task(self, prober: StreamProber):
+        '''check all streams waiting for the probed url'''
+        try:
+            with self.__intlock:
+                streams: List[IPTVStream] = self.__waiting.pop(prober)
+            for stream in streams:
+                self.__check_task(stream)
+        finally:  # drain waits for every release
+            self.__release(prober)
+
+    def __release(self, prober: StreamProber):
+        '''hand over host slot to next deferred prober, count probe done'''
+        deferred: Optional[StreamProber] = self.__hosts.release(host_of(prober.url))  # noqa:E501
+        if deferred is not None:
+            self.__ready.put(deferred)  # workers never submit, avoid deadlock
+        with self.__drained:
+            self.__outstanding -= 1
+            self.__running -= 1
+            if self.__outstanding <= 0:
+                self.__ready.put(None)  # wake up drain
+            self.__drained.notify_all()
+
+    def __probe_task(self, prober: StreamProber, queued: float):
+        '''probe unique url once'''
+        METRICS.observe("queue_wait_seconds", monotonic() - queued, stage="probe")  # noqa:E501
+        try:
+            prober.data  # pylint: disable=pointless-statement
+        finally:
+            self.__fanout_task(prober)
+
+    def __dispatch(self, prober: StreamProber, checker: TaskPool):
+        with self.__drained:
+            self.__running += 1
+        if prober.backend == "asyncio":
+            self.__inflight.acquire()  # backpressure of event loop
+            future = ASYNCPROBES.submit(self.__aprobe_task(prober, monotonic()))  # noqa:E501
+            future.add_done_callback(lambda _: self.__inflight.release())
+            # unbounded jobs, submit never blocks the event loop thread
+            future.add_done_callback(lambda _: self.__fanouts.submit(self.__fanout_task, prober))  # noqa:E501
+            return
+        checker.submit(self.__probe_task, prober, monotonic())
+
+    def __dispatch_ready(self, checker: TaskPool):
+        '''dispatch deferred probers whose host slot was released'''
+        while True:
+            try:
+                prober: Optional[StreamProber] = self.__ready.get_nowait()
             except Empty:
-                if not self.running:
-                    break
+                return
+            if prober is not None:
+                self.__dispatch(prober, checker)
+
+    def __drain(self, checker: TaskPool):
+        '''dispatch deferred probers until all unique probes fanned out'''
+        while True:
+            with self.__drained:
+                if self.__outstanding <= 0 and self.__ready.empty():
+                    return
+            prober: Optional[StreamProber] = self.__ready.get(block=True)
+            if prober is not None:
+                self.__dispatch(prober, checker)
+
+    def __priority(self, prober: StreamProber) -> Tuple[int, float, int, float]:  # noqa:E501
+        '''channels without verified stream, reliable urls, first candidates
+        of channels and short expected latency first
+        '''
+        verified: bool = all(s.tvg_id in self.__verified for s in self.__waiting.get(prober, ()))  # noqa:E501
+        return int(verified), -prober.uptime, self.__rank.get(prober, 0), prober.expected_latency  # noqa:E501
+
+    def __skip(self, prober: StreamProber):
+        '''mark streams of prober unprobed, hand over its host slot'''
+        with self.__intlock:
+            streams: List[IPTVStream] = self.__waiting.pop(prober)
+        self.unprobed.extend(streams)
+        for stream in streams:
+            self.cmds.stdout(f"{stream.name}, {stream.url}, unprobed")
+        METRICS.count("streams_unprobed", len(streams))
+        self.__running += 1  # released as if probed
+        self.__release(prober)
+
+    def __take(self) -> Optional[StreamProber]:
+        '''deferred prober owning its host slot, or the most valuable one'''
+        while True:
+            try:
+                deferred: Optional[StreamProber] = self.__ready.get_nowait()
+            except Empty:
+                break
+            if deferred is not None:
+                return deferred
+        while self.__pending:
+            key, _, prober = heappop(self.__pending)
+            current: Tuple[int, float, int, float] = self.__priority(prober)
+            if current > key:  # channel verified meanwhile
+                heappush(self.__pending, (current, next(self.__sequence), prober))  # noqa:E501
+                continue
+            if self.__hosts.admit(host_of(prober.url), prober):
+                return prober
+            METRICS.count("probes_deferred")
+        return None
+
+    def __prioritize(self, checker: TaskPool, capacity: int):
+        '''dispatch most valuable probes first, skip probes that cannot finish
+        within budget, return once all unique probes are done or skipped
+        '''
+        while True:
+            with self.__drained:
+                if self.__loading <= 0 and self.__outstanding <= 0:
+                    return
+                prober: Optional[StreamProber] = None
+                if self.__running < capacity or self.remaining <= 0:
+                    prober = self.__take()
+                if prober is None:
+                    self.__drained.wait(min(1.0, self.remaining) or 1.0)
+                    continue
+                if self.remaining < prober.timeout:
+                    self.__skip(prober)
+                    continue
+            self.__dispatch(prober, checker)
+
+    def __schedule(self, stream: IPTVStream, checker: TaskPool):
+        '''probe each unique url once, fan out result to duplicate streams'''
+        prober: StreamProber = stream.prober
+        with self.__intlock:
+            self.__scheduled += 1
+            if prober in self.__waiting:  # probing, wait for result
+                self.__waiting[prober].append(stream)
+                return
+            cached: bool = not prober.expired  # probed or cached
+            if not cached:
+                self.__waiting[prober] = [stream]
+                self.__unique += 1
+                if self.budget > 0 and stream.tvg_id:
+                    self.__rank[prober] = self.__ranks.get(stream.tvg_id, 0)
+                    self.__ranks[stream.tvg_id] = self.__rank[prober] + 1
+        if cached:  # never submit to bounded queue under lock of workers
+            checker.submit(self.__check_task, stream, monotonic())
+            return
+        with self.__drained:
+            self.__outstanding += 1
+            if self.budget > 0:  # dispatched by priority
+                heappush(self.__pending, (self.__priority(prober), next(self.__sequence), prober))  # noqa:E501
+                self.__drained.notify_all()
+                return
+        if self.__hosts.admit(host_of(prober.url), prober):
+            self.__dispatch(prober, checker)
+        else:
+            METRICS.count("probes_deferred")
+
+    async def __aprobe_task(self, prober: StreamProber, queued: float):
+        METRICS.observe("queue_wait_seconds", monotonic() - queued, stage="probe")  # noqa:E501
+        return await prober.aprobe()
+
+    def __reliable(self, stream: IPTVStream) -> bool:
+        '''unknown or short history is reliable enough to probe'''
+        reliability = stream.prober.reliability
+        if self.min_uptime <= 0 or reliability is None or reliability.probes < self.MIN_HISTORY:  # noqa:E501
+            return True
+        return reliability.uptime >= self.min_uptime
+
+    def __load_task(self, index: int, playlist: str, checker: TaskPool,
+                    session: Session):
+        '''load playlist and schedule its streams as they are parsed'''
+        started: float = monotonic()
+        loaded: int = 0
+        try:
+            for stream in Tunes.iterload(playlist, session=session):
+                loaded += 1
+                if not all(s.match(stream) for s in self.selectors):
+                    METRICS.count("streams_dropped")
+                    continue
+                if not self.__reliable(stream):
+                    METRICS.count("streams_unreliable")
+                    continue
+                if not self.check:
+                    checker.submit(self.__check_task, stream, monotonic())
+                    continue
+                if self.best:
+                    with self.__intlock:
+                        self.__candidates.append((index, loaded, stream))
+                    continue
+                self.__schedule(stream, checker)
+                if self.budget <= 0:
+                    self.__dispatch_ready(checker)
+        except OSError as error:
+            self.cmds.stderr(f"failed to load {playlist}: {error}")
+            METRICS.count("playlists_loaded", outcome="failed")
+        else:
+            METRICS.count("playlists_loaded", outcome="success")
+        finally:
+            METRICS.observe("load_seconds", monotonic() - started)
+            METRICS.count("streams_loaded", loaded)
+            with self.__drained:
+                self.__loading -= 1
+                self.__drained.notify_all()
 
-    def __check_task(self, stream: IPTVStream):
-        '''check stream availability'''
-        if not self.check or stream.available or not self.filter:
+    def __race(self, limit: int):
+        '''race candidates of each channel within budget, merge only the
+        winners, candidates of channels without winner skipped by budget
+        are unprobed, candidates of each channel in order of playlists
+        and their positions, not in order concurrent loaders finished
+        '''
+        candidates: Tunes = Tunes()
+        candidates.extend([c[2] for c in sorted(self.__candidates, key=lambda c: c[:2])])  # noqa:E501
+        deadline: float = self.__deadline if self.budget > 0 else 0.0
+        with METRICS.timer("race_seconds"):
+            winners: List[IPTVStream] = candidates.best(
+                self.best == "fastest", self.__accept, limit, deadline,
+                self.host_limit)
+        self.cmds.stderr(f"race {len(candidates.streams)} streams of {len(candidates)} channels: {len(winners)} winners")  # noqa:E501
+        METRICS.gauge("race_winners", len(winners))
+        for stream in winners:
             self.streams.put(stream, block=True)
+        if self.budget > 0:
+            self.__unraced(candidates, winners)
 
-    def save(self, path: str) -> bool:
-        '''save playlist to file'''
-        return self.playlists.dumpfile(path)
+    def __unraced(self, candidates: Tunes, winners: List[IPTVStream]):
+        '''candidates of channels without winner, not probed by deadline'''
+        won: Set[Any] = {s.tvg_id if s.tvg_id else id(s) for s in winners}
+        streams: List[IPTVStream] = [
+            s for s in candidates.streams if s.prober.expired
+            and (s.tvg_id if s.tvg_id else id(s)) not in won]
+        self.unprobed.extend(streams)
+        for stream in streams:
+            self.cmds.stdout(f"{stream.name}, {stream.url}, unprobed")
+        METRICS.count("streams_unprobed", len(streams))
+
+    def save(self, path: str, compress: bool = False) -> bool:
+        '''save playlist to file, tiered playlists to path.TIER.m3u'''
+        with METRICS.timer("dump_seconds"):
+            root: str = path[:-4] if path.endswith(".m3u") else path
+            for name, tunes in self.tiers.items():
+                tunes.dumpfile(f"{root}.{name}", compress=compress)
+            if self.unprobed.streams:
+                self.unprobed.dumpfile(f"{root}.unprobed", compress=compress)
+            return self.playlists.dumpfile(path, compress=compress)
 
     def list(self, playlists: List[str], workers: int = 64,
-             output: Optional[str] = None):
-        with TaskPool(workers=workers, prefix="check_task") as checker:
-            for playlist in playlists:
-                tune = Tunes.load(playlist)
-                for stream in tune.streams:
-                    checker.submit(self.__check_task, stream)
+             output: Optional[str] = None, loaders: int = 4,
+             compress: bool = False):
+        started: float = monotonic()
+        self.__deadline = started + self.budget
+        self.__loading = len(playlists)
+        jobs: int = workers * self.QUEUE_FACTOR
+        self.__inflight = Semaphore(ASYNCPROBES.limit * self.QUEUE_FACTOR)
+        self.__fanouts = TaskPool(workers=workers, prefix="fanout_task")
+        adapter = HTTPAdapter(pool_connections=loaders, pool_maxsize=loaders)
+        session: Session = Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        with TaskPool(workers=workers, jobs=jobs, prefix="check_task") as checker:  # noqa:E501
+            with self.__fanouts:  # shut down after all fan-outs are drained
+                with TaskPool(workers=loaders, prefix="load_task") as loader:
+                    for index, playlist in enumerate(playlists):
+                        loader.submit(self.__load_task, index, playlist,
+                                      checker, session)
+                    if self.budget > 0:
+                        self.__prioritize(checker, ASYNCPROBES.limit if STREAMPROBERS.backend == "asyncio" else workers)  # noqa:E501
+                self.__drain(checker)
+        if self.best:
+            self.__race(ASYNCPROBES.limit if STREAMPROBERS.backend == "asyncio" else workers)  # noqa:E501
         self.barrier()
+        if self.check and not self.best:
+            self.cmds.stderr(f"dedup {self.__scheduled} streams into {self.__unique} probed urls, ratio {self.dedup_ratio:.2f}")  # noqa:E501
+        if self.budget > 0:
+            self.cmds.stderr(f"budget {self.budget:.0f}s: {len(self.unprobed.streams)} streams unprobed, {len(self.__verified)} channels verified")  # noqa:E501
         if output:
-            self.save(output)
+            self.save(output, compress=compress)
+        METRICS.gauge("streams_scheduled", self.__scheduled)
+        METRICS.gauge("unique_probes", self.__unique)
+        METRICS.gauge("dedup_ratio", self.dedup_ratio)
+        METRICS.gauge("run_seconds", monotonic() - started)
+
+
+class ProbeTask(TaskPool):
+    '''probe many urls concurrently, write one json line per url as it completes'''  # noqa:E501
+    QUEUE_FACTOR = 4  # bounded jobs per worker for backpressure
+
+    def __init__(self, workers: int = 8, timeout: float = 3.0):
+        super().__init__(workers=workers, jobs=workers * self.QUEUE_FACTOR,
+                         prefix="probe_task")
+        self.__timeout: float = max(1.0, timeout)
+        self.__intlock: Lock = Lock()  # internal lock
+        self.__total: int = 0
+        self.__good: int = 0
+
+    def __str__(self) -> str:
+        return f"probe {self.total} urls: {self.good} good, {self.total - self.good} bad"  # noqa:E501
+
+    @property
+    def timeout(self) -> float:
+        return self.__timeout
+
+    @property
+    def total(self) -> int:
+        return self.__total
+
+    @property
+    def good(self) -> int:
+        return self.__good
+
+    @classmethod
+    def codecs(cls, data: Dict[str, Any]) -> List[str]:
+        '''codec summary of probe data, like: video/h264/1280x720'''
+        summary: List[str] = []
+        for stream in data.get("streams", []):
+            items: List[str] = [stream.get("codec_type", "unknown"),
+                                stream.get("codec_name", "unknown")]
+            if stream.get("width") and stream.get("height"):
+                items.append(f"{stream['width']}x{stream['height']}")
+            summary.append("/".join(items))
+        return summary
+
+    def record(self, url: str) -> Dict[str, Any]:
+        '''probe url by shared prober, error is None or class of failure'''
+        prober: StreamProber = STREAMPROBERS.alloc(url, self.timeout)
+        try:
+            data: Dict[str, Any] = prober.data
+        except Exception as error:  # pylint: disable=broad-except
+            # like ffprobe is not installed or malformed url
+            return {"url": url, "score": -1, "latency": 0.0, "error": type(error).__name__,  # noqa:E501
+                    "message": str(error), "format": "", "codecs": []}
+        fmt: Dict[str, Any] = data.get("format", {})
+        outcome: str = prober.outcome or "cached"
+        return {"url": url, "score": StreamProber.Format(fmt).probe_score,
+                "latency": round(prober.latency, 3),
+                "error": None if prober.success else outcome,
+                "format": fmt.get("format_name", ""), "codecs": self.codecs(data)}  # noqa:E501
+
+    def __probe_task(self, url: str):
+        record: Dict[str, Any] = self.record(url)
+        with self.__intlock:
+            self.__total += 1
+            self.__good += int(record["score"] >= IPTVStream.MIN_SCORE)
+            self.cmds.stdout(dumps(record))
+
+    def __prune(self):
+        '''forget finished jobs, urls may stream in without end'''
+        for no in [k for k, job in self.items() if job.stopped > 0]:
+            self.pop(no, None)
+
+    def probe(self, urls: Iterable[str]) -> int:
+        '''submit urls as they are read, blocked while the queue is full'''
+        submitted: int = 0
+        for url in urls:
+            self.submit(self.__probe_task, url)
+            submitted += 1
+            if submitted % (self.workers * self.QUEUE_FACTOR) == 0:
+                self.__prune()
+        return submitted
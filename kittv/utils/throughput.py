@@ -0,0 +1,187 @@
+# coding:utf-8
+
+import asyncio
+from asyncio import StreamReader
+from threading import Lock
+from time import monotonic
+from typing import List
+from urllib.parse import urljoin
+
+from xkits import singleton
+
+from .aioprobe import AsyncProbe
+from .aioprobe import AsyncProbeError
+from .aioprobe import AsyncProbeTimeout
+from .options import THROUGHPUT_DURATION
+
+
+@singleton
+class BandwidthBudget():
+    '''admission of throughput measurements under a shared budget, a
+    measurement starts only when the budget can cover it and is never
+    throttled, so waiting for the budget cannot lower the measured rate
+    '''
+    POLL = 0.1  # seconds between admission retries while budget is in use
+
+    def __init__(self, rate: float = 0.0):
+        self.__rate: float = max(0.0, rate)  # bytes per second, 0 unlimited
+        self.__tokens: float = self.__rate  # burst of one second
+        self.__stamp: float = monotonic()
+        self.__running: float = 0.0  # reserved rate of running measurements
+        self.__estimate: float = self.__rate  # rate of one measurement
+        self.__intlock: Lock = Lock()  # internal lock
+
+    @property
+    def rate(self) -> float:
+        '''bytes per second, 0 is unlimited'''
+        return self.__rate
+
+    @rate.setter
+    def rate(self, rate: float):
+        with self.__intlock:
+            self.__rate = max(0.0, rate)
+            self.__tokens = self.__rate
+            self.__stamp = monotonic()
+            self.__running = 0.0
+            self.__estimate = self.__rate
+
+    def __refill(self):
+        now: float = monotonic()
+        self.__tokens = min(self.__rate, self.__tokens + (now - self.__stamp) * self.__rate)  # noqa:E501
+        self.__stamp = now
+
+    def admit(self) -> float:
+        '''reserve estimated rate of one measurement, return 0 if admitted
+        or seconds to wait before retrying
+        '''
+        if self.__rate <= 0:
+            return 0.0
+        with self.__intlock:
+            self.__refill()
+            if self.__tokens < 0:  # pay off bytes of finished measurements
+                return -self.__tokens / self.__rate
+            if self.__running > 0 and self.__running + self.__estimate > self.__rate:  # noqa:E501
+                return self.POLL
+            self.__running += self.__estimate
+            return 0.0
+
+    def release(self, size: int, elapsed: float):
+        '''take downloaded bytes of an admitted measurement from budget'''
+        if self.__rate <= 0:
+            return
+        with self.__intlock:
+            self.__refill()
+            self.__running = max(0.0, self.__running - self.__estimate)
+            self.__tokens -= size  # borrow, later measurements wait longer
+            if elapsed > 0:  # moving average of measured rates
+                self.__estimate = (self.__estimate + size / elapsed) / 2
+
+
+BANDWIDTH: BandwidthBudget = BandwidthBudget()
+
+
+class ThroughputMeter(AsyncProbe):
+    '''sustained download rate of http stream, like reference/m3u-tester.py'''
+    DURATION = THROUGHPUT_DURATION
+
+    def __init__(self, url: str, timeout: float, duration: float = DURATION):
+        super().__init__(url, timeout)
+        self.__duration: float = max(0.1, duration)
+        self.__received: int = 0
+        self.__waited: float = 0.0
+
+    def __str__(self) -> str:
+        return f"IPTV Stream Throughput Meter URL={self.url}"
+
+    @property
+    def duration(self) -> float:
+        return self.__duration
+
+    @property
+    def received(self) -> int:
+        return self.__received
+
+    @property
+    def waited(self) -> float:
+        '''seconds waiting for bandwidth budget before measuring'''
+        return self.__waited
+
+    async def resolve(self, url: str, depth: int = 0) -> List[str]:
+        '''media urls to download, all segments of HLS media playlist'''
+        if depth > self.NESTING:
+            raise AsyncProbeError(f"too deep playlist nesting: {self.url}")
+        url, _, body = await self.fetch(url)
+        head: bytes = body.lstrip(b"\xef\xbb\xbf \t\r\n")
+        if not head.startswith(b"#EXTM3U"):
+            return [url]
+        text: str = head.decode("utf-8", errors="replace")
+        uris = [line.strip() for line in text.splitlines()
+                if line.strip() and not line.startswith("#")]
+        if not uris:
+            raise AsyncProbeError(f"empty playlist: {url}")
+        if "#EXT-X-STREAM-INF" in text:
+            return await self.resolve(urljoin(url, uris[0]), depth + 1)
+        return [urljoin(url, uri) for uri in uris]
+
+    async def __admit(self):
+        started: float = monotonic()
+        try:
+            while True:
+                delay: float = BANDWIDTH.admit()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            self.__waited += monotonic() - started
+
+    async def __drain(self, reader: StreamReader):
+        while True:
+            chunk: bytes = await reader.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            self.__received += len(chunk)
+
+    async def download(self, url: str):
+        '''download until end of stream, follow redirects'''
+        for _ in range(self.REDIRECTS + 1):
+            status, headers, reader, writer = await self.connect(url)
+            try:
+                if status in (301, 302, 303, 307, 308) and "location" in headers:  # noqa:E501
+                    url = urljoin(url, headers["location"])
+                    continue
+                if status >= 300:
+                    raise AsyncProbeError(f"HTTP {status}: {url}")
+                return await self.__drain(reader)
+            finally:
+                writer.close()
+        raise AsyncProbeError(f"too many redirects: {self.url}")
+
+    async def __download(self, urls: List[str], deadline: float):
+        for url in urls:
+            if monotonic() >= deadline:
+                break
+            try:
+                await asyncio.wait_for(self.download(url),
+                                       timeout=deadline - monotonic())
+            except asyncio.TimeoutError:
+                break  # downloaded for the whole duration
+
+    async def measure(self) -> float:
+        '''bytes per second over wall time of download, wait for bandwidth
+        budget before the download starts, not while it is measured
+        '''
+        try:
+            urls: List[str] = await asyncio.wait_for(self.resolve(self.url),
+                                                     timeout=self.timeout)
+            await self.__admit()
+            started: float = monotonic()
+            try:
+                await self.__download(urls, started + self.duration)
+            finally:
+                elapsed: float = monotonic() - started
+                BANDWIDTH.release(self.received, elapsed)
+        except asyncio.TimeoutError as error:
+            raise AsyncProbeTimeout(f"timeout: {self.url}") from error
+        except (OSError, ValueError, asyncio.IncompleteReadError) as error:
+            raise AsyncProbeError(f"{error}: {self.url}") from error
+        return self.received / max(elapsed, 0.001)
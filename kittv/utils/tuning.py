@@ -1,20 +1,172 @@
 # coding:utf-8
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from gzip import GzipFile
+from heapq import heappop
+from heapq import heappush
+from itertools import count
 import os
+from tempfile import mkstemp
+from threading import Event
+from time import monotonic
+from typing import Awaitable
+from typing import BinaryIO
+from typing import Callable
 from typing import Dict
+from typing import Generator
+from typing import Iterable
 from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Sequence
 from typing import Tuple
 
+from ipytv.channel import from_playlist_entry
+from ipytv.m3u import M3U_HEADER_TAG
 from ipytv.playlist import M3UPlaylist
 from ipytv.playlist import loadf
 from ipytv.playlist import loadu
+from requests import Session
 
+from .aioprobe import ASYNCPROBES
+from .hosts import HostSlots
+from .hosts import host_of
+from .metrics import METRICS
 from .stream import IPTVStream
+from .stream import StreamProber
+
+Accept = Callable[[IPTVStream], bool]
+
+
+def available(stream: IPTVStream) -> bool:
+    return stream.available
+
+
+class RaceSlots():
+    '''bounded concurrent probes of racing candidates, lower rank first,
+    so preferred candidates of all channels are probed before fallbacks,
+    skip probes that cannot finish before deadline (monotonic, 0 is none),
+    at most host_limit concurrent probes per host (0 is unlimited)
+    '''
+
+    def __init__(self, limit: int = 64, deadline: float = 0.0,
+                 host_limit: int = 0):
+        self.__limit: int = max(1, limit)
+        self.__deadline: float = deadline
+        self.__hosts: HostSlots[asyncio.Future] = HostSlots(host_limit)
+        self.__free: int = self.__limit
+        self.__waiters: List[Tuple[int, int, asyncio.Future]] = []  # heap
+        self.__sequence: Iterator[int] = count()  # tie breaker of heap
+        self.__executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=self.__limit, thread_name_prefix="race_task")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__executor.shutdown(wait=False)
+
+    @property
+    def limit(self) -> int:
+        return self.__limit
+
+    @property
+    def deadline(self) -> float:
+        return self.__deadline
+
+    def __late(self, prober: StreamProber) -> bool:
+        return self.deadline > 0 and self.deadline - monotonic() < prober.timeout  # noqa:E501
+
+    async def __acquire(self, rank: int):
+        if self.__free > 0 and not self.__waiters:
+            self.__free -= 1
+            return
+        waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+        heappush(self.__waiters, (rank, next(self.__sequence), waiter))
+        try:
+            await waiter  # slot is handed over by release
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.__release()  # handed over just before cancelled
+            raise
+
+    def __release(self):
+        while self.__waiters:
+            waiter: asyncio.Future = heappop(self.__waiters)[2]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.__free += 1
+
+    async def __enter(self, host: str):
+        '''take a slot of host before a slot of the race'''
+        waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+        if self.__hosts.admit(host, waiter):
+            return
+        try:
+            await waiter  # slot of host is handed over by leave
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.__leave(host)  # handed over just before cancelled
+            raise
+
+    def __leave(self, host: str):
+        while True:
+            waiter: Optional[asyncio.Future] = self.__hosts.release(host)
+            if waiter is None or not waiter.done():
+                break
+        if waiter is not None:
+            waiter.set_result(None)
+
+    @classmethod
+    def __probe(cls, prober: StreamProber, cancelled: Event) -> bool:
+        '''probe in executor thread unless the race is already over'''
+        if cancelled.is_set():
+            return False
+        METRICS.count("race_probes")
+        prober.data  # pylint: disable=pointless-statement
+        return True
+
+    async def judge(self, accept: Accept, stream: IPTVStream) -> bool:
+        '''accept in executor thread, never block the event loop if the
+        prober expired meanwhile and probes again
+        '''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.__executor, accept, stream)
+
+    async def probe(self, prober: StreamProber, cancelled: Event,
+                    rank: int = 0) -> bool:
+        '''probe by backend of prober, False if cancelled before probe or
+        skipped by deadline, a skipped prober stays expired
+        '''
+        host: str = host_of(prober.url)
+        await self.__enter(host)
+        try:
+            await self.__acquire(rank)
+            try:
+                return await self.__run(prober, cancelled)
+            finally:
+                self.__release()
+        finally:
+            self.__leave(host)
+
+    async def __run(self, prober: StreamProber, cancelled: Event) -> bool:
+        if self.__late(prober):
+            METRICS.count("race_skipped")
+            return False
+        if prober.backend != "asyncio":
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.__executor, self.__probe, prober, cancelled)  # noqa:E501
+        METRICS.count("race_probes")
+        await prober.aprobe()
+        return True
 
 
 class Tunes():
     class Chain(List[IPTVStream]):
+        __slots__ = ("__tvg_id",)
+
         def __init__(self, tvg_id: str):
             self.__tvg_id: str = tvg_id
 
@@ -26,9 +178,78 @@ class Tunes():
         def available_stream(self) -> Tuple[IPTVStream, ...]:
             return tuple(s for s in self if s.available)
 
-    def __init__(self):
+        @classmethod
+        async def __check(cls, stream: IPTVStream, accept: Accept,
+                          cancelled: Event, slots: RaceSlots, rank: int) -> bool:  # noqa:E501
+            if not await slots.probe(stream.prober, cancelled, rank):
+                return False
+            return await slots.judge(accept, stream)
+
+        @classmethod
+        def __decide(cls, order: Sequence[IPTVStream], verdicts: Sequence[Optional[bool]],  # noqa:E501
+                     fastest: bool) -> Optional[IPTVStream]:
+            '''first accepted candidate, None while waiting for a preferred
+            candidate in order or for any candidate if fastest
+            '''
+            for stream, verdict in zip(order, verdicts):
+                if verdict:
+                    return stream
+                if verdict is None and not fastest:
+                    return None  # wait for preferred candidate
+            return None
+
+        @classmethod
+        async def race(cls, streams: Sequence[IPTVStream], fastest: bool = False,  # noqa:E501
+                       accept: Accept = available,
+                       slots: Optional[RaceSlots] = None) -> Optional[IPTVStream]:  # noqa:E501
+            '''probe candidates concurrently and cancel the rest once decided,
+            the first accepted candidate in order, or the fastest accepted one
+            '''
+            candidates: Dict[StreamProber, IPTVStream] = {}
+            for stream in streams:
+                candidates.setdefault(stream.prober, stream)
+            order: List[IPTVStream] = list(candidates.values())
+            if slots is None:
+                with RaceSlots(len(order)) as own:
+                    return await cls.race(order, fastest, accept, own)
+            verdicts: List[Optional[bool]] = [  # cached results decide at once
+                None if s.prober.expired else await slots.judge(accept, s)
+                for s in order]
+            winner: Optional[IPTVStream] = cls.__decide(order, verdicts, fastest)  # noqa:E501
+            if winner is not None or all(v is not None for v in verdicts):
+                return winner
+            cancelled: Event = Event()
+            pending: Dict[asyncio.Future, int] = {
+                asyncio.ensure_future(cls.__check(s, accept, cancelled, slots, i)): i  # noqa:E501
+                for i, s in enumerate(order) if verdicts[i] is None}
+            try:
+                while pending:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)  # noqa:E501
+                    for future in done:
+                        verdicts[pending.pop(future)] = future.result()
+                    winner = cls.__decide(order, verdicts, fastest)
+                    if winner is not None:
+                        return winner
+                return None
+            finally:
+                cancelled.set()
+                for future in pending:
+                    future.cancel()
+                METRICS.count("race_cancelled", len(pending))
+
+        async def arace(self, fastest: bool = False, accept: Accept = available,  # noqa:E501
+                        slots: Optional[RaceSlots] = None) -> Optional[IPTVStream]:  # noqa:E501
+            return await self.race(self, fastest, accept, slots)
+
+        def best_stream(self, fastest: bool = False) -> Optional[IPTVStream]:
+            '''first (or fastest) available stream, probe candidates concurrently'''  # noqa:E501
+            coro = self.arace(fastest)
+            return asyncio.run_coroutine_threadsafe(coro, ASYNCPROBES.loop).result()  # noqa:E501
+
+    def __init__(self, by_uptime: bool = False):
         self.__streams: List[IPTVStream] = []
         self.__channels: Dict[str, Tunes.Chain] = {}
+        self.__by_uptime: bool = by_uptime
 
     def __get(self, tvg_id: str) -> Chain:
         if tvg_id not in self.__channels:
@@ -55,32 +276,122 @@ class Tunes():
     def channels(self) -> Dict[str, Chain]:
         return self.__channels
 
+    @property
+    def by_uptime(self) -> bool:
+        '''most reliable streams of each channel first'''
+        return self.__by_uptime
+
+    def sorted(self, streams: List[IPTVStream]) -> List[IPTVStream]:
+        if self.by_uptime:
+            return sorted(streams, key=lambda s: (-s.prober.uptime, s.name, s.url))  # noqa:E501
+        return sorted(streams, key=lambda s: (s.name, s.url))
+
     @property
     def playlist(self) -> M3UPlaylist:
         playlist: M3UPlaylist = M3UPlaylist()
         for key in sorted(self.channels.keys()):
-            streams: List[IPTVStream] = self.channels[key]
-            for stream in sorted(streams, key=lambda s: s.channel.name):
+            for stream in self.sorted(self.channels[key]):
                 playlist.append_channel(stream.channel)
         return playlist
 
+    async def arace(self, fastest: bool = False, accept: Accept = available,
+                    limit: int = 64, deadline: float = 0.0,
+                    host_limit: int = 0) -> List[IPTVStream]:
+        '''one best stream per channel, each stream without tvg-id is a channel'''  # noqa:E501
+        with RaceSlots(limit, deadline, host_limit) as slots:
+            races: List[Awaitable[Optional[IPTVStream]]] = []
+            for chain in self:
+                if chain.tvg_id:
+                    races.append(chain.arace(fastest, accept, slots))
+                else:
+                    races.extend(Tunes.Chain.race([s], fastest, accept, slots) for s in chain)  # noqa:E501
+            return [w for w in await asyncio.gather(*races) if w is not None]  # noqa:E501
+
+    def best(self, fastest: bool = False, accept: Accept = available,
+             limit: int = 64, deadline: float = 0.0,
+             host_limit: int = 0) -> List[IPTVStream]:
+        '''race in background loop, not limited by slots of asyncio probes,
+        candidates skipped by deadline stay expired
+        '''
+        coro = self.arace(fastest, accept, limit, deadline, host_limit)
+        return asyncio.run_coroutine_threadsafe(coro, ASYNCPROBES.loop).result()  # noqa:E501
+
     def append(self, stream: IPTVStream):
         self.__streams.append(stream)
         self.__get(tvg_id=stream.tvg_id).append(stream)
 
     def extend(self, streams: List[IPTVStream]):
+        self.__streams.extend(streams)
         for stream in streams:
-            self.append(stream)
+            self.__get(tvg_id=stream.tvg_id).append(stream)
+
+    def iterdump(self) -> Generator[str, None, None]:
+        '''yield m3u plus rows in sorted tvg_id and name order'''
+        yield f"{M3U_HEADER_TAG}\n"
+        for key in sorted(self.channels.keys()):
+            for stream in self.sorted(self.channels[key]):
+                yield stream.channel.to_m3u_plus_playlist_entry()
+
+    @classmethod
+    def __mkstemp(cls, abspath: str) -> Tuple[BinaryIO, str]:
+        dirname, basename = os.path.split(abspath)
+        fd, temp = mkstemp(prefix=f".{basename}.", suffix=".tmp", dir=dirname)
+        # mkstemp creates 0600, keep target readable as a normal file does
+        os.chmod(temp, os.stat(abspath).st_mode & 0o777
+                 if os.path.exists(abspath) else 0o644)
+        return os.fdopen(fd, "wb"), temp
 
-    def dumpfile(self, filename: str) -> bool:
+    def __write(self, whdl: BinaryIO, zfileobj: Optional[BinaryIO]):
+        '''write rows, gzip variant to zfileobj in the same pass'''
+        zhdl = GzipFile(fileobj=zfileobj, mode="wb", mtime=0) if zfileobj is not None else None  # noqa:E501
+        for chunk in self.iterdump():
+            data: bytes = chunk.encode("utf-8")
+            whdl.write(data)
+            if zhdl is not None:
+                zhdl.write(data)
+        if zhdl is not None:
+            zhdl.close()  # flush gzip trailer, keep fileobj open
+
+    @classmethod
+    def __replace(cls, handles: List[Tuple[BinaryIO, str]], targets: List[str]):  # noqa:E501
+        '''fsync temp files and rename them into place'''
+        for hdl, _ in handles:
+            hdl.flush()
+            os.fsync(hdl.fileno())
+            hdl.close()
+        for (_, temp), target in zip(handles, targets):
+            os.replace(temp, target)
+
+    @classmethod
+    def __fsyncdir(cls, dirname: str):
+        dirfd: int = os.open(dirname, os.O_RDONLY)
+        try:
+            os.fsync(dirfd)  # persist renames
+        finally:
+            os.close(dirfd)
+
+    def dumpfile(self, filename: str, compress: bool = False) -> bool:
+        '''write to temp file, fsync and rename into place atomically,
+        optionally write gzip variant (filename.gz) in the same pass
+        '''
         if not filename.endswith(".m3u"):
             filename += ".m3u"
         abspath: str = os.path.abspath(filename)
         dirname: str = os.path.dirname(abspath)
         if not os.path.exists(dirname):
             os.makedirs(dirname)
-        with open(abspath, "w") as whdl:
-            whdl.write(self.dumpstr())
+        targets: List[str] = [abspath] + ([f"{abspath}.gz"] if compress else [])  # noqa:E501
+        handles: List[Tuple[BinaryIO, str]] = [self.__mkstemp(t) for t in targets]  # noqa:E501
+        try:
+            self.__write(handles[0][0], handles[1][0] if compress else None)
+            self.__replace(handles, targets)
+        except BaseException:
+            for hdl, temp in handles:
+                hdl.close()
+                if os.path.exists(temp):
+                    os.remove(temp)
+            raise
+        self.__fsyncdir(dirname)
         return True
 
     def dumpstr(self) -> str:
@@ -102,3 +413,42 @@ class Tunes():
     def load(cls, file_or_url: str) -> "Tunes":
         return cls.loadfile(file_or_url) if os.path.isfile(
             file_or_url) else cls.loadurl(file_or_url)
+
+    @classmethod
+    def iterlines(cls, lines: Iterable[str]) -> Generator[IPTVStream, None, None]:  # noqa:E501
+        '''parse m3u incrementally, yield stream once its url row arrives'''
+        entry: List[str] = []
+        for line in lines:
+            row: str = line.strip()
+            if not row or row.startswith("#EXTM3U"):
+                continue
+            if row.startswith("#EXTINF"):
+                entry = [row]
+            elif row.startswith("#"):
+                if entry:  # tags between #EXTINF and url
+                    entry.append(row)
+            else:
+                entry.append(row)
+                yield IPTVStream(from_playlist_entry(entry))
+                entry = []
+
+    @classmethod
+    def iterfile(cls, filename: str) -> Generator[IPTVStream, None, None]:
+        with open(filename, "r", encoding="utf-8", errors="replace") as rhdl:
+            yield from cls.iterlines(rhdl)
+
+    @classmethod
+    def iterurl(cls, url: str, timeout: float = 30.0,
+                session: Optional[Session] = None
+                ) -> Generator[IPTVStream, None, None]:
+        session = session or Session()
+        with session.get(url, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            response.encoding = "utf-8"
+            yield from cls.iterlines(response.iter_lines(decode_unicode=True))
+
+    @classmethod
+    def iterload(cls, file_or_url: str, session: Optional[Session] = None
+                 ) -> Generator[IPTVStream, None, None]:
+        return cls.iterfile(file_or_url) if os.path.isfile(
+            file_or_url) else cls.iterurl(file_or_url, session=session)
@@ -0,0 +1,155 @@
+# coding:utf-8
+
+from heapq import heappop
+from heapq import heappush
+from itertools import count
+from threading import Condition
+from threading import Event
+from time import monotonic
+from time import time
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from requests import Session
+from xkits import TaskPool
+
+from .metrics import METRICS
+from .stream import IPTVStream
+from .stream import StreamProber
+from .tuning import Tunes
+
+
+class WatchTask(TaskPool):
+    '''re-probe due streams in expiry order, rewrite filtered playlist'''
+    QUEUE_FACTOR = 4  # bounded jobs per worker for backpressure
+    SLACK = 1.0  # seconds after expiry, cache is expired strictly after
+
+    def __init__(self, workers: int = 8, rate: float = 1.0,
+                 interval: float = 300.0):
+        super().__init__(workers=workers, jobs=workers * self.QUEUE_FACTOR,
+                         prefix="watch_task")
+        self.__schedule: List[Tuple[float, int, StreamProber]] = []  # heap
+        self.__streams: List[IPTVStream] = []
+        self.__condition: Condition = Condition()
+        self.__stopping: Event = Event()
+        self.__sequence: Iterator[int] = count()  # tie breaker of heap
+        self.__rate: float = max(0.0, rate)
+        self.__interval: float = max(1.0, interval)
+        self.__probes: int = 0
+
+    @property
+    def rate(self) -> float:
+        '''maximum probes per second, 0 is unlimited'''
+        return self.__rate
+
+    @property
+    def interval(self) -> float:
+        '''seconds between output rewrites'''
+        return self.__interval
+
+    @property
+    def streams(self) -> List[IPTVStream]:
+        return self.__streams
+
+    @property
+    def pending(self) -> int:
+        '''probers waiting in schedule'''
+        return len(self.__schedule)
+
+    @property
+    def probes(self) -> int:
+        return self.__probes
+
+    @property
+    def stopping(self) -> bool:
+        return self.__stopping.is_set()
+
+    def stop(self):
+        self.__stopping.set()
+        with self.__condition:
+            self.__condition.notify_all()
+
+    def __push(self, prober: StreamProber):
+        due: float = prober.expires + self.SLACK if not prober.expired else time()  # noqa:E501
+        with self.__condition:
+            heappush(self.__schedule, (due, next(self.__sequence), prober))
+            self.__condition.notify()
+
+    def load(self, playlists: List[str], session: Optional[Session] = None) -> int:  # noqa:E501
+        '''load playlists once, schedule each unique prober by expiry'''
+        probers: Set[StreamProber] = set()
+        for playlist in playlists:
+            try:
+                for stream in Tunes.iterload(playlist, session=session):
+                    self.__streams.append(stream)
+                    if stream.prober not in probers:
+                        probers.add(stream.prober)
+                        self.__push(stream.prober)
+            except OSError as error:
+                self.cmds.stderr(f"failed to load {playlist}: {error}")
+        return len(probers)
+
+    def __probe_task(self, prober: StreamProber):
+        '''probe due url, then schedule it again by new expiry'''
+        try:
+            prober.data  # pylint: disable=pointless-statement
+            self.cmds.stdout(f"{prober.url}, {'good' if prober.success else 'bad'}")  # noqa:E501
+        finally:
+            self.__push(prober)
+
+    def __next(self, deadline: float) -> Optional[StreamProber]:
+        '''wait for the earliest due prober until deadline (monotonic)'''
+        with self.__condition:
+            while not self.stopping:
+                now: float = time()
+                if self.__schedule and self.__schedule[0][0] <= now:
+                    return heappop(self.__schedule)[2]
+                timeout: float = deadline - monotonic()
+                if self.__schedule:
+                    timeout = min(timeout, self.__schedule[0][0] - now)
+                if timeout <= 0:
+                    return None
+                self.__condition.wait(timeout)
+        return None
+
+    def __prune(self):
+        '''forget finished jobs, the daemon submits jobs forever'''
+        for no in [k for k, job in self.items() if job.stopped > 0]:
+            self.pop(no, None)
+
+    def dump(self, path: str, compress: bool = False) -> bool:
+        '''write streams available at their last probe, never probe'''
+        with METRICS.timer("dump_seconds"):
+            tunes: Tunes = Tunes()
+            tunes.extend([s for s in self.streams if s.last_available])
+            return tunes.dumpfile(path, compress=compress)
+
+    def watch(self, output: Optional[str] = None, compress: bool = False,
+              prometheus: Optional[str] = None):
+        '''dispatch due probes at limited rate until stop'''
+        deadline: float = monotonic() + self.interval
+        while not self.stopping:
+            prober: Optional[StreamProber] = self.__next(deadline)
+            if prober is not None:
+                self.submit(self.__probe_task, prober)
+                self.__probes += 1
+                if self.rate > 0:
+                    self.__stopping.wait(1.0 / self.rate)
+            if monotonic() >= deadline:
+                self.flush(output, compress, prometheus)
+                deadline = monotonic() + self.interval
+
+    def flush(self, output: Optional[str] = None, compress: bool = False,
+              prometheus: Optional[str] = None):
+        '''rewrite output playlist and metrics'''
+        self.__prune()
+        if output:
+            self.dump(output, compress=compress)
+        METRICS.gauge("watch_pending", self.pending)
+        METRICS.gauge("watch_probes", self.probes)
+        if prometheus:
+            METRICS.dumpfile(prometheus, prometheus=True)
+        self.cmds.stderr(f"watch {len(self.streams)} streams: {self.probes} probes dispatched, {self.pending} pending")  # noqa:E501
@@ -0,0 +1,73 @@
+# coding:utf-8
+
+import os
+from tempfile import TemporaryDirectory
+from time import time
+import unittest
+
+from kittv.utils.database import ProbeDatabase
+
+
+class TestProbeDatabase(unittest.TestCase):
+    URL = "http://example.com/a.ts"
+
+    def setUp(self):
+        self.temp = TemporaryDirectory()  # pylint: disable=consider-using-with  # noqa:E501
+        self.database = ProbeDatabase(os.path.join(self.temp.name, "probes.db"))  # noqa:E501
+
+    def tearDown(self):
+        self.database.close()
+        self.temp.cleanup()
+
+    def test_save_and_load(self):
+        self.assertIsNone(self.database.load(self.URL))
+        data = {"format": {"probe_score": 100}}
+        self.database.save(self.URL, data, True, 3.0, 10800.0, time() + 60)
+        record = self.database.load(self.URL)
+        assert record is not None
+        self.assertEqual(record.data, data)
+        self.assertTrue(record.success)
+        self.assertEqual(len(self.database), 1)
+
+    def test_reliability_without_history(self):
+        reliability = self.database.reliability(self.URL)
+        self.assertEqual(reliability.probes, 0)
+        self.assertEqual(reliability.uptime, 0.0)
+        self.assertEqual(reliability.p50, 0.0)
+        self.assertEqual(reliability.failures, 0)
+
+    def test_reliability(self):
+        now: float = time()
+        # oldest first: up, up, down, up, down, down
+        for age, score, latency in ((60, 100, 0.4), (50, 100, 0.1),
+                                    (40, 0, 3.0), (30, 100, 0.2),
+                                    (20, 0, 3.0), (10, 0, 3.0)):
+            self.database.record(self.URL, score, latency,
+                                 "success" if score else "timeout",
+                                 timestamp=now - age)
+        reliability = self.database.reliability(self.URL, min_score=90)
+        self.assertEqual(reliability.probes, 6)
+        self.assertEqual(reliability.uptime, 0.5)
+        self.assertEqual(reliability.p50, 0.2)  # of available probes only
+        self.assertEqual(reliability.p90, 0.4)
+        self.assertEqual(reliability.failures, 2)  # consecutive latest
+
+    def test_reliability_window(self):
+        self.database.record(self.URL, 100, 0.1, "success",
+                             timestamp=time() - ProbeDatabase.HISTORY_WINDOW - 60)  # noqa:E501
+        self.database.record(self.URL, 0, 3.0, "timeout")
+        reliability = self.database.reliability(self.URL)
+        self.assertEqual(reliability.probes, 1)
+        self.assertEqual(reliability.uptime, 0.0)
+        self.assertEqual(reliability.failures, 1)
+
+    def test_prune(self):
+        self.database.record(self.URL, 100, 0.1, "success",
+                             timestamp=time() - 3600)
+        self.database.record(self.URL, 100, 0.1, "success")
+        self.assertEqual(self.database.prune(retention=60), 1)
+        self.assertEqual(len(self.database.history(self.URL)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# coding:utf-8
+
+import unittest
+
+from kittv.utils.hosts import HostCircuit
+from kittv.utils.hosts import HostSlots
+from kittv.utils.hosts import host_of
+
+
+class TestHostOf(unittest.TestCase):
+
+    def test_host_of(self):
+        self.assertEqual(host_of("http://Example.com:8080/a.ts"),
+                         "example.com")
+        self.assertEqual(host_of("http://[::1"), "")
+        self.assertEqual(host_of("/local/a.ts"), "")
+
+
+class TestHostCircuit(unittest.TestCase):
+
+    def test_trip_after_threshold(self):
+        circuit = HostCircuit("example.com", threshold=2, cooldown=60.0)
+        circuit.report(False)
+        self.assertEqual(circuit.state, HostCircuit.CLOSED)
+        self.assertTrue(circuit.allow())
+        circuit.report(False)
+        self.assertEqual(circuit.state, HostCircuit.OPEN)
+        self.assertFalse(circuit.allow())
+        self.assertFalse(circuit.allow())
+        self.assertEqual(circuit.tripped, 2)
+
+    def test_reachable_resets_failures(self):
+        circuit = HostCircuit("example.com", threshold=2, cooldown=60.0)
+        circuit.report(False)
+        circuit.report(True)
+        circuit.report(False)
+        self.assertEqual(circuit.state, HostCircuit.CLOSED)
+
+    def test_half_open_after_cooldown(self):
+        circuit = HostCircuit("example.com", threshold=1, cooldown=0.0)
+        circuit.report(False)
+        self.assertEqual(circuit.state, HostCircuit.OPEN)
+        self.assertTrue(circuit.allow())  # trial probe
+        self.assertEqual(circuit.state, HostCircuit.HALF_OPEN)
+        circuit.report(False)  # trial failed, open again
+        self.assertEqual(circuit.state, HostCircuit.OPEN)
+        self.assertTrue(circuit.allow())
+        circuit.report(True)
+        self.assertEqual(circuit.state, HostCircuit.CLOSED)
+        self.assertEqual(circuit.tripped, 0)
+
+
+class TestHostSlots(unittest.TestCase):
+
+    def test_unlimited(self):
+        slots: HostSlots[str] = HostSlots(0)
+        self.assertTrue(all(slots.admit("a", str(i)) for i in range(10)))
+        self.assertIsNone(slots.release("a"))
+        self.assertEqual(slots.deferred, 0)
+
+    def test_defer_in_order(self):
+        slots: HostSlots[str] = HostSlots(1)
+        self.assertTrue(slots.admit("a", "a1"))
+        self.assertFalse(slots.admit("a", "a2"))
+        self.assertFalse(slots.admit("a", "a3"))
+        self.assertTrue(slots.admit("b", "b1"))  # other host
+        self.assertEqual(slots.deferred, 2)
+        self.assertEqual(slots.release("a"), "a2")  # slot handed over
+        self.assertEqual(slots.release("a"), "a3")
+        self.assertIsNone(slots.release("a"))
+        self.assertEqual(slots.deferred, 0)
+        self.assertTrue(slots.admit("a", "a4"))  # slot is free again
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+# coding:utf-8
+
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from json import dumps
+import os
+from tempfile import TemporaryDirectory
+from threading import Thread
+from typing import Any
+from typing import Dict
+from typing import List
+import unittest
+
+from requests import HTTPError
+
+from kittv.utils.iptv_org import IPTV_ORG_API
+
+BLOCKLIST = [{"channel": "Blocked.us", "ref": "https://example.com/1"}]
+ETAG = '"v1"'
+
+
+class Handler(BaseHTTPRequestHandler):
+    '''304 for a matching etag, or for every request if always_304'''
+    requests: List[Dict[str, Any]] = []
+    always_304: bool = False
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.requests.append(dict(self.headers))
+        if self.always_304 or self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body: bytes = dumps(BLOCKLIST).encode("utf-8")
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin  # noqa:E501
+        pass
+
+
+class TestConditionalFetch(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = TemporaryDirectory()  # pylint: disable=consider-using-with  # noqa:E501
+        Handler.requests = []
+        Handler.always_304 = False
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        base: str = f"http://127.0.0.1:{self.server.server_port}"
+
+        class API(IPTV_ORG_API):  # pylint: disable=too-few-public-methods
+            API_URL = base
+
+        self.api = API(cache=self.temp.name)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp.cleanup()
+
+    def test_fetch_and_cache(self):
+        self.assertEqual(list(self.api.blocklist), ["Blocked.us"])
+        self.assertTrue(os.path.isfile(os.path.join(self.temp.name, "blocklist.json")))  # noqa:E501
+        self.assertNotIn("If-None-Match", Handler.requests[0])
+
+    def test_not_modified(self):
+        self.api.load("blocklist")
+        self.api.load("blocklist", force=True)
+        self.assertEqual(len(Handler.requests), 2)
+        self.assertEqual(Handler.requests[1].get("If-None-Match"), ETAG)
+        self.assertEqual(list(self.api.blocklist), ["Blocked.us"])  # kept
+
+    def test_fresh_copy_without_request(self):
+        self.api.load("blocklist")
+        self.api.load("blocklist")
+        self.assertEqual(len(Handler.requests), 1)
+
+    def test_304_without_copy(self):
+        '''unconditional 304 by a proxy, fetch in full without conditions'''
+        Handler.always_304 = True
+        with self.assertRaises(HTTPError):
+            self.api.load("blocklist")
+        self.assertEqual(len(Handler.requests), 2)
+        self.assertEqual(Handler.requests[1].get("Cache-Control"), "no-cache")
+        self.assertFalse(os.path.exists(os.path.join(self.temp.name, "blocklist.json")))  # noqa:E501
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+# coding:utf-8
+
+import os
+from tempfile import TemporaryDirectory
+from time import time
+import unittest
+
+from kittv.utils.shard import ShardQueue
+from kittv.utils.shard import shard_of
+from kittv.utils.stream import STREAMPROBERS
+
+
+class TestShardQueue(unittest.TestCase):
+
+    def setUp(self):
+        # shared probers of merged results are fresh, urls of each test
+        self.urls = [f"http://shard.test/{self._testMethodName}/{i}.ts"
+                     for i in range(8)]
+        self.temp = TemporaryDirectory()  # pylint: disable=consider-using-with  # noqa:E501
+        playlist: str = os.path.join(self.temp.name, "streams.m3u")
+        with open(playlist, "w", encoding="utf-8") as whdl:
+            whdl.write("#EXTM3U\n")
+            for i, url in enumerate(self.urls + self.urls[:2]):  # duplicates
+                whdl.write(f'#EXTINF:-1 tvg-id="ch{i}.us",ch{i}\n{url}\n')
+        self.queue = ShardQueue(os.path.join(self.temp.name, "queue"))
+        self.assertEqual(self.queue.split([playlist], 3), len(self.urls))
+
+    def tearDown(self):
+        self.temp.cleanup()
+
+    def test_shard_of(self):
+        self.assertEqual(shard_of("HTTP://Shard.test:80/1.ts", 3),
+                         shard_of("http://shard.test/1.ts", 3))
+        self.assertEqual(shard_of("http://shard.test/1.ts", 0), 0)
+
+    def test_split(self):
+        manifest = self.queue.manifest
+        assert manifest is not None
+        self.assertEqual(manifest["shards"], 3)
+        self.assertEqual(manifest["streams"], 10)
+        self.assertEqual(manifest["urls"], 8)
+        self.assertEqual(len(self.queue.pending) + len(self.queue.done), 3)
+
+    def test_claim(self):
+        claimed = []
+        while True:
+            shard = self.queue.claim()
+            if shard is None:
+                break
+            claimed.append(shard)
+            for url in self.queue.urls(shard):
+                self.assertEqual(shard_of(url, 3), shard)
+        self.assertEqual(self.queue.pending, [])
+        self.assertEqual(self.queue.claimed, claimed)
+        self.assertEqual(sorted(u for s in claimed for u in self.queue.urls(s)),  # noqa:E501
+                         sorted(self.urls))
+
+    def test_requeue(self):
+        shard = self.queue.claim()
+        assert shard is not None
+        self.assertEqual(self.queue.requeue(stale=3600.0), 0)  # heartbeat
+        claimed: str = self.queue.path(shard, "claimed")
+        os.utime(claimed, (time() - 60, time() - 60))  # worker is gone
+        self.assertEqual(self.queue.requeue(stale=30.0), 1)
+        self.assertIn(shard, self.queue.pending)
+        self.assertNotIn(shard, self.queue.claimed)
+
+    def test_merge(self):
+        while True:
+            shard = self.queue.claim()
+            if shard is None:
+                break
+            records = [{"url": url, "data": {"format": {"probe_score": 100}},
+                        "success": True, "timeout": 3.0, "lifetime": 10800.0,
+                        "expires": time() + 60, "score": 100, "latency": 0.1,
+                        "outcome": "success"} for url in self.queue.urls(shard)]  # noqa:E501
+            self.queue.finish(shard, records)
+        self.assertTrue(self.queue.complete)
+        self.assertEqual(self.queue.claimed, [])
+        self.assertEqual(self.queue.merge(), len(self.urls))
+        for url in self.urls:
+            prober = STREAMPROBERS[url]
+            self.assertFalse(prober.expired)
+            self.assertEqual(prober.format.probe_score, 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+# coding:utf-8
+
+from json import loads
+import subprocess
+import sys
+import unittest
+
+from kittv.utils.options import HEAVY_MODULES
+
+SCRIPT = f"""
+import sys
+from kittv.cmds import main
+try:
+    main(sys.argv[1:])
+except SystemExit:
+    pass
+print(__import__("json").dumps({{"heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""  # noqa:E501
+
+
+def startup(*argv: str) -> dict:
+    output = subprocess.check_output([sys.executable, "-c", SCRIPT, *argv],
+                                     stderr=subprocess.DEVNULL)
+    return loads(output.decode().splitlines()[-1])
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_version_without_heavy_modules(self):
+        self.assertEqual(startup("--version")["heavy"], [])
+
+    def test_help_without_heavy_modules(self):
+        for command in ("playlist", "probe", "shard", "watch"):
+            with self.subTest(command=command):
+                self.assertEqual(startup(command, "--help")["heavy"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
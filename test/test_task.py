@@ -0,0 +1,88 @@
+# coding:utf-8
+
+import asyncio
+import os
+from tempfile import TemporaryDirectory
+from typing import Any
+from typing import Dict
+from typing import List
+import unittest
+from unittest import mock
+
+from kittv.utils.aioprobe import ASYNCPROBES
+from kittv.utils.stream import STREAMPROBERS
+from kittv.utils.stream import StreamProber
+from kittv.utils.task import PlaylistTask
+
+
+class TestBudget(unittest.TestCase):
+    '''probes by priority within budget, the others are unprobed'''
+
+    def setUp(self):
+        self.temp = TemporaryDirectory()  # pylint: disable=consider-using-with  # noqa:E501
+        self.backend: str = STREAMPROBERS.backend
+        self.limit: int = ASYNCPROBES.limit
+        STREAMPROBERS.backend = "asyncio"
+        ASYNCPROBES.limit = 1  # one probe at a time, in order of priority
+        self.probed: List[str] = []
+
+    def tearDown(self):
+        STREAMPROBERS.backend = self.backend
+        ASYNCPROBES.limit = self.limit
+        self.temp.cleanup()
+
+    def playlist(self, name: str, rows: List[str]) -> str:
+        path: str = os.path.join(self.temp.name, f"{name}.m3u")
+        with open(path, "w", encoding="utf-8") as whdl:
+            whdl.write("#EXTM3U\n")
+            for row in rows:
+                tvg_id, url = row.split(" ")
+                whdl.write(f'#EXTINF:-1 tvg-id="{tvg_id}",{tvg_id}\n{url}\n')
+        return path
+
+    def run_task(self, playlist: str, budget: float) -> PlaylistTask:
+        probed: List[str] = self.probed
+
+        async def aprobe(prober: StreamProber) -> Dict[str, Any]:
+            probed.append(prober.url)
+            await asyncio.sleep(0.1)
+            data = {"format": {"format_name": "mpegts", "probe_score": 100}}
+            return prober.update(data, True)
+
+        output: str = os.path.join(self.temp.name, "output.m3u")
+        with mock.patch.object(StreamProber, "aprobe", aprobe):
+            with PlaylistTask(filter=True, budget=budget) as tasker:
+                tasker.list(playlists=[playlist], workers=4, output=output)
+        return tasker
+
+    def test_priority(self):
+        playlist: str = self.playlist("priority", [
+            "a.us http://budget.test/priority/a0.ts",
+            "a.us http://budget.test/priority/a1.ts",
+            "b.us http://budget.test/priority/b0.ts"])
+        tasker = self.run_task(playlist, budget=60.0)
+        # first candidates of channels before fallbacks
+        self.assertEqual(self.probed, ["http://budget.test/priority/a0.ts",
+                                       "http://budget.test/priority/b0.ts",
+                                       "http://budget.test/priority/a1.ts"])
+        self.assertEqual(len(tasker.playlists.streams), 3)
+        self.assertEqual(tasker.unprobed.streams, [])
+
+    def test_skip(self):
+        playlist: str = self.playlist("skip", [
+            "a.us http://budget.test/skip/a0.ts",
+            "a.us http://budget.test/skip/a1.ts",
+            "b.us http://budget.test/skip/b0.ts"])
+        # probe timeout is longer than budget, no probe can finish in time
+        tasker = self.run_task(playlist, budget=0.5)
+        self.assertEqual(self.probed, [])
+        self.assertEqual(tasker.playlists.streams, [])
+        self.assertEqual(sorted(s.url for s in tasker.unprobed.streams),
+                         ["http://budget.test/skip/a0.ts",
+                          "http://budget.test/skip/a1.ts",
+                          "http://budget.test/skip/b0.ts"])
+        self.assertTrue(os.path.isfile(os.path.join(self.temp.name, "output.unprobed.m3u")))  # noqa:E501
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+# coding:utf-8
+
+import asyncio
+from time import monotonic
+from typing import Any
+from typing import Dict
+from typing import List
+import unittest
+from unittest import mock
+
+from kittv.utils.stream import STREAMPROBERS
+from kittv.utils.stream import IPTVStream
+from kittv.utils.stream import StreamProber
+from kittv.utils.tuning import RaceSlots
+from kittv.utils.tuning import Tunes
+
+PLAYLIST = """#EXTM3U x-tvg-url="http://example.com/epg.xml"
+
+#EXTVLCOPT:ignored before any entry
+#EXTINF:-1 tvg-id="one.us" group-title="News",One
+#EXTVLCOPT:http-user-agent=kittv
+http://tunes.test/one.m3u8
+#EXTINF:-1 tvg-id="two.us",Two
+http://tunes.test/two.ts
+"""
+
+
+def streams(*rows: str) -> List[IPTVStream]:
+    '''streams of channel tvg_id from url rows'''
+    lines: List[str] = []
+    for row in rows:
+        tvg_id, url = row.split(" ")
+        lines.extend([f'#EXTINF:-1 tvg-id="{tvg_id}",{tvg_id}', url])
+    return list(Tunes.iterlines(lines))
+
+
+class FakeProbes():  # pylint: disable=too-few-public-methods
+    '''asyncio probes by url: seconds to answer and probe score'''
+
+    def __init__(self, results: Dict[str, Any]):
+        self.results: Dict[str, Any] = results
+        self.probed: List[str] = []
+        self.running: int = 0
+        self.concurrent: int = 0
+
+    def patch(self):
+        fake = self
+
+        async def aprobe(prober: StreamProber) -> Dict[str, Any]:
+            fake.probed.append(prober.url)
+            fake.running += 1
+            fake.concurrent = max(fake.concurrent, fake.running)
+            try:
+                delay, score = fake.results[prober.url]
+                await asyncio.sleep(delay)
+            finally:
+                fake.running -= 1
+            data = {"format": {"format_name": "mpegts", "probe_score": score}}
+            return prober.update(data, score > 0)
+
+        return mock.patch.object(StreamProber, "aprobe", aprobe)
+
+
+class TestIterlines(unittest.TestCase):
+
+    def test_iterlines(self):
+        result = list(Tunes.iterlines(PLAYLIST.splitlines()))
+        self.assertEqual([s.name for s in result], ["One", "Two"])
+        self.assertEqual([s.url for s in result],
+                         ["http://tunes.test/one.m3u8",
+                          "http://tunes.test/two.ts"])
+        self.assertEqual([s.tvg_id for s in result], ["one.us", "two.us"])
+
+    def test_incremental(self):
+        '''yield each stream once its url row arrives'''
+        consumed: List[str] = []
+
+        def lines():
+            for line in PLAYLIST.splitlines():
+                consumed.append(line)
+                yield line
+
+        iterator = Tunes.iterlines(lines())
+        first: IPTVStream = next(iterator)
+        self.assertEqual(first.name, "One")
+        self.assertEqual(consumed[-1], "http://tunes.test/one.m3u8")
+
+    def test_shared_prober(self):
+        result = streams("a.us http://Tunes.test/shared.ts?utm_source=x",
+                         "b.us http://tunes.test:80/shared.ts")
+        self.assertIs(result[0].prober, result[1].prober)
+
+
+class TestChainRace(unittest.TestCase):
+
+    def setUp(self):
+        self.backend: str = STREAMPROBERS.backend
+        STREAMPROBERS.backend = "asyncio"
+
+    def tearDown(self):
+        STREAMPROBERS.backend = self.backend
+
+    def race(self, candidates: List[IPTVStream], fastest: bool = False,
+             **kwargs: Any) -> Any:
+        async def run():
+            with RaceSlots(**kwargs) as slots:
+                return await Tunes.Chain.race(candidates, fastest,
+                                              slots=slots)
+        return asyncio.run(run())
+
+    def test_first_in_order(self):
+        candidates = streams("ch.us http://race.test/first/slow.ts",
+                             "ch.us http://race.test/first/fast.ts")
+        fake = FakeProbes({"http://race.test/first/slow.ts": (0.2, 100),
+                           "http://race.test/first/fast.ts": (0.0, 100)})
+        with fake.patch():
+            winner = self.race(candidates)
+        self.assertIs(winner, candidates[0])
+
+    def test_fastest(self):
+        candidates = streams("ch.us http://race.test/fastest/slow.ts",
+                             "ch.us http://race.test/fastest/fast.ts")
+        fake = FakeProbes({"http://race.test/fastest/slow.ts": (0.5, 100),
+                           "http://race.test/fastest/fast.ts": (0.0, 100)})
+        with fake.patch():
+            winner = self.race(candidates, fastest=True)
+        self.assertIs(winner, candidates[1])
+        self.assertTrue(candidates[0].prober.expired)  # cancelled
+
+    def test_fallback_and_none(self):
+        candidates = streams("ch.us http://race.test/fallback/bad.ts",
+                             "ch.us http://race.test/fallback/good.ts")
+        fake = FakeProbes({"http://race.test/fallback/bad.ts": (0.0, 0),
+                           "http://race.test/fallback/good.ts": (0.1, 100)})
+        with fake.patch():
+            self.assertIs(self.race(candidates), candidates[1])
+        candidates = streams("ch.us http://race.test/none/a.ts",
+                             "ch.us http://race.test/none/b.ts")
+        fake = FakeProbes({"http://race.test/none/a.ts": (0.0, 0),
+                           "http://race.test/none/b.ts": (0.0, 0)})
+        with fake.patch():
+            self.assertIsNone(self.race(candidates))
+
+    def test_cached_decides_without_probe(self):
+        candidates = streams("ch.us http://race.test/cached/a.ts",
+                             "ch.us http://race.test/cached/b.ts")
+        fake = FakeProbes({"http://race.test/cached/a.ts": (0.0, 100),
+                           "http://race.test/cached/b.ts": (0.0, 100)})
+        with fake.patch():
+            self.race(candidates)
+            fake.probed.clear()
+            self.assertIs(self.race(candidates), candidates[0])
+        self.assertEqual(fake.probed, [])
+
+    def test_duplicate_urls_probed_once(self):
+        candidates = streams("ch.us http://race.test/dup/a.ts",
+                             "ch.us http://race.test/dup/a.ts?utm_source=x")
+        fake = FakeProbes({"http://race.test/dup/a.ts": (0.0, 100)})
+        with fake.patch():
+            self.assertIs(self.race(candidates), candidates[0])
+        self.assertEqual(fake.probed, ["http://race.test/dup/a.ts"])
+
+    def test_host_limit(self):
+        candidates = streams(*(f"ch.us http://race.test/limit/{i}.ts"
+                               for i in range(4)))
+        fake = FakeProbes({s.url: (0.05, 0) for s in candidates})
+        with fake.patch():
+            self.assertIsNone(self.race(candidates, limit=8, host_limit=1))
+        self.assertEqual(fake.concurrent, 1)
+        self.assertEqual(len(fake.probed), 4)
+
+    def test_deadline_skips_probes(self):
+        candidates = streams("ch.us http://race.test/deadline/a.ts")
+        fake = FakeProbes({"http://race.test/deadline/a.ts": (0.0, 100)})
+        with fake.patch():
+            self.assertIsNone(self.race(candidates, deadline=monotonic() + 0.5))  # noqa:E501
+        self.assertEqual(fake.probed, [])
+        self.assertTrue(candidates[0].prober.expired)
+
+
+if __name__ == "__main__":
+    unittest.main()